@@ -1,7 +1,16 @@
 # This is where you build your AI for the Chess game.
 
+import math
+import multiprocessing
+import queue
+import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
+from games.chess.move_encoding import NULL_MOVE, is_promotion, is_tactical, move_to_str, to_server_args
+from games.chess.ordering import MoveOrdering
 from games.chess.state import State
+from games.chess.transposition import DEFAULT_SIZE_MB, EXACT, LOWER, UPPER, SharedTranspositionTable, \
+    TranspositionTable, shared_memory
 from joueur.base_ai import BaseAI
 
 infinity = float('inf')
@@ -26,7 +35,39 @@ class AI(BaseAI):
         and game. You can initialize your AI here.
         """
 
-        # replace with your start logic
+        # Transposition table, kept for the whole game. Its size in megabytes can be set with --aiSettings tt_mb=N
+        size_mb = self.get_setting("tt_mb")
+        size_mb = float(size_mb) if size_mb else DEFAULT_SIZE_MB
+        # Number of processes searching each turn, set with --aiSettings processes=N, and how they divide the work:
+        # parallel=smp for lazy SMP or parallel=split for root splitting
+        processes = self.get_setting("processes")
+        self.processes = int(processes) if processes else 1
+        self.split_pool = None
+        if self.processes > 1 and self.get_setting("parallel") == "split":
+            if sys.version_info < (3, 7):
+                # ProcessPoolExecutor only takes a start method and an initializer from 3.7
+                print("Root splitting needs Python 3.7 or later, searching in a single process")
+                self.processes = 1
+            else:
+                # Started now so that no turn pays for starting processes
+                self.split_pool = RootSplitPool(self.processes, size_mb)
+        elif self.processes > 1 and shared_memory is None:
+            print("Parallel search needs Python 3.8 or later, searching in a single process")
+            self.processes = 1
+        # Searching the position after the opponent's expected reply while they think, set with --aiSettings ponder=1
+        self.pondering = self.get_setting("ponder") == "1"
+        if self.pondering and (shared_memory is None or self.split_pool is not None):
+            print("Pondering needs Python 3.8 or later and cannot be combined with root splitting, not pondering")
+            self.pondering = False
+        self.ponder_key = None
+        self.ponder_search = None
+        if self.split_pool is not None:
+            table = None  # Every search is done by the pool's processes, each with a table of its own
+        elif self.processes > 1 or self.pondering:
+            table = SharedTranspositionTable(size_mb)
+        else:
+            table = TranspositionTable(size_mb)
+        self.engine = Engine(table, read_search_options(self.get_setting))
 
     def game_updated(self):
         """ This is called every time the game's state updates, so if you are
@@ -46,7 +87,13 @@ class AI(BaseAI):
                           lost.
         """
 
-        # replace with your end logic
+        if self.ponder_search is not None:
+            self.ponder_search.stop()
+            self.ponder_search.result()
+        if self.split_pool is not None:
+            self.split_pool.shutdown()
+        elif isinstance(self.engine.table, SharedTranspositionTable):
+            self.engine.table.close()
 
     def run_turn(self):
         """ This is called every time it is this AI.player's turn.
@@ -68,19 +115,49 @@ class AI(BaseAI):
         print("Time Remaining: " + str(self.player.time_remaining) + " ns")
 
         # 4) Make a move
-        current_state = State(self.game)
-        choice, best_utility = mini_max_decision(current_state)
-
-        if choice.promotion is not None:
-            choice.piece.move(choice.file, choice.rank, choice.promotion)
+        current_state = self.engine.update(self.game)
+        ponder_search = self.ponder_search
+        self.ponder_search = None
+        helpers = []
+        if ponder_search is not None and current_state.hash == self.ponder_key:
+            # The opponent played the expected reply: the ponder search goes on as a lazy SMP helper
+            print("Ponder hit")
+            helpers.append(ponder_search)
         else:
-            choice.piece.move(choice.file, choice.rank)
+            if ponder_search is not None:
+                # What the ponder search found stays in the transposition table
+                ponder_search.stop()
+                ponder_search.result()
+            if self.engine.table is not None:
+                self.engine.table.new_search()
+        choice, best_utility = self.engine.decide(self.processes, self.split_pool, helpers)
+
+        piece = current_state.server_piece(choice)
+        piece.move(*to_server_args(choice))
 
         print("Best utility: %s" % best_utility)
-        print("%s %s%s" % (choice.piece.type, choice.piece.file, choice.piece.rank))
+        print("%s %s" % (piece.type, move_to_str(choice)))
         print("\n")
+        self.engine.played(choice)
+        if self.pondering:
+            self.start_pondering()
         return True
 
+    def start_pondering(self):
+        """ Starts searching the position after the opponent's expected reply, in a process of its own that runs
+            until the opponent has moved.
+        """
+        engine = self.engine
+        if not engine.expected_line:
+            return  # No reply to expect
+        reply = engine.expected_line[0]
+        engine.state.make_move(reply)
+        engine.table.new_search()
+        self.ponder_key = engine.state.hash
+        self.ponder_search = SearchProcess(engine.state.fen, engine.table, infinity, engine.options)
+        engine.state.unmake_move()
+        print("Pondering on %s" % move_to_str(reply))
+
     def print_current_board(self):
         """Prints the current board using pretty ASCII art
         Note: you can delete this function if you wish
@@ -129,167 +206,646 @@ class AI(BaseAI):
         print(self.game.fen)
 
 states_checked = 0
+quiescence_states_checked = 0
 start_time = 0
 EXPECTED_MOVES = 75
 MAX_TURN_TIME = 900 / EXPECTED_MOVES  # 15 minutes * 60 seconds / 1 minute = 900 seconds
+CHECKMATE_UTILITY = 200000  # Value of king
+NO_SCORE = -CHECKMATE_UTILITY - 1  # Below every score a search can return
+MAX_SEARCH_DEPTH = 64
+# Scores beyond this are checkmates, found that many plies from CHECKMATE_UTILITY
+MATE_THRESHOLD = CHECKMATE_UTILITY - 2 * MAX_SEARCH_DEPTH
+# A capture that cannot bring the score up to alpha even with this much positional gain is not searched
+DELTA_MARGIN = 200
+TIME_CHECK_INTERVAL = 1024  # Nodes searched between looks at the clock
+WORKER_STOP_TIME = 1  # Seconds search processes get to report back once told to stop
+
+# Selective search parameters, each can be overridden with --aiSettings name=value
+DEFAULT_SEARCH_OPTIONS = {
+    # Null-move pruning: give the opponent a free move and search shallower, a position still at least beta after
+    # that is cut off
+    "null_move": 1,
+    "null_move_min_depth": 3,
+    "null_move_reduction": 2,
+    # Late move reductions: quiet moves ordered late are searched base + ln(depth) * ln(moves tried) / divisor
+    # plies shallower, and again at full depth only if they beat alpha
+    "lmr": 1,
+    "lmr_min_depth": 3,
+    "lmr_min_moves": 3,
+    "lmr_base": 0.75,
+    "lmr_divisor": 2.25,
+    # Futility pruning: with 1 or 2 plies left, quiet moves are skipped when the static evaluation plus the margin
+    # for that depth cannot reach alpha
+    "futility": 1,
+    "futility_margin_1": 150,
+    "futility_margin_2": 300,
+    # Razoring: with at most razor_depth plies left and the static evaluation razor_margin per ply below alpha,
+    # the node is settled by quiescence search
+    "razoring": 1,
+    "razor_depth": 2,
+    "razor_margin": 300,
+    # Late move pruning: with at most lmp_depth plies left, quiet moves past lmp_base + depth * depth are skipped
+    "lmp": 1,
+    "lmp_depth": 3,
+    "lmp_base": 3,
+    # Aspiration windows: iterations after the first search a window of aspiration_window centipawns either side of
+    # the previous score, doubling it on the side that fails until the score lands inside
+    "aspiration": 1,
+    "aspiration_window": 25,
+}
+
+
+def read_search_options(get_setting):
+    """ :param get_setting: function returning the string value of an AI setting, or None if it is not set
+        :return dict of search options, the defaults overridden by the settings given
+    """
+    options = dict(DEFAULT_SEARCH_OPTIONS)
+    for name, default in DEFAULT_SEARCH_OPTIONS.items():
+        value = get_setting(name)
+        if value is not None:
+            options[name] = type(default)(value)
+    return options
+
+
+def reduction_table(options):
+    """ :return list of lists, the late move reduction in plies indexed [depth][moves tried] """
+    return [[0 if depth == 0 or moves == 0 else
+             max(0, int(options["lmr_base"] + math.log(depth) * math.log(moves) / options["lmr_divisor"]))
+             for moves in range(64)] for depth in range(MAX_SEARCH_DEPTH + 1)]
+
+
+class SearchTimeout(Exception):
+    """ Raised inside the search when the time budget runs out, abandoning the iteration in progress """
+
+
+class Engine:
+    def __init__(self, table, options=None):
+        """ What the search keeps from one turn to the next: the position with the moves of the game made on it, the
+            transposition table, the killer and history tables, and the line the last search expected to follow.
+
+            :param table: TranspositionTable to search with, None when every search is split over a RootSplitPool
+            :param options: dict of selective search options, DEFAULT_SEARCH_OPTIONS by default
+        """
+        self.table = table
+        self.options = DEFAULT_SEARCH_OPTIONS if options is None else options
+        self.ordering = MoveOrdering()
+        self.state = None
+        # Expected moves from the position after our last move, the opponent's reply first
+        self.expected_line = []
+        # Move expected to be best in the current position, when the opponent played the expected reply
+        self.expected_move = None
+        # Deepest iteration the last search completed and the best line it found
+        self.completed_depth = 0
+        self.principal_variation = []
+
+    def update(self, game):
+        """ Brings the position up to date with the game. The opponent's move is made on the kept position when it
+            can be found, so that the moves of the game so far count towards repetitions, and the killer moves are
+            moved up the two plies played since the last search.
+
+            :param game: the Game to read the current position from
+            :return State the current position
+        """
+        state = State(game)
+        previous = self.state
+        self.expected_move = None
+        if previous is not None:
+            for move in list(previous.moves):
+                previous.make_move(move)
+                if previous.hash == state.hash:
+                    state = previous
+                    if self.expected_line[:1] == [move] and len(self.expected_line) > 1:
+                        self.expected_move = self.expected_line[1]
+                    break
+                previous.unmake_move()
+        if state is previous:
+            self.ordering.shift_killers(2)
+        else:
+            self.ordering.clear_killers()
+        self.state = state
+        return state
 
+    def decide(self, processes=1, split_pool=None, helpers=()):
+        """ Chooses a move in the current position, searching in this process, with lazy SMP when there are several
+            processes or helper searches, or with root splitting over split_pool.
 
-# noinspection PyUnboundLocalVariable
-def mini_max_decision(state):  # returns an action
-    """ Decides what move to take by the MiniMax algorithm detailed in chapter 5 """
-    global start_time
-    start_time = time.time()
-    player = to_move(state)
-    history_table = dict()
+            :return tuple (move, utility)
+        """
+        if split_pool is not None:
+            result = mini_max_decision(self.state, self.table, options=self.options, expected_move=self.expected_move,
+                                       split_pool=split_pool)
+        elif processes > 1 or helpers:
+            result = lazy_smp_decision(self.state, self.table, processes, options=self.options, helpers=helpers,
+                                       ordering=self.ordering, expected_move=self.expected_move)
+        else:
+            result = mini_max_decision(self.state, self.table, options=self.options, ordering=self.ordering,
+                                       expected_move=self.expected_move)
+        move, score, self.completed_depth, self.principal_variation = result
+        return move, score
 
-    print("MiniMax Decision")
+    def played(self, move):
+        """ Makes the chosen move on the position and keeps the rest of the line the search expected """
+        self.state.make_move(move)
+        line = self.principal_variation
+        self.expected_line = line[1:] if line[:1] == [move] else []
 
-    def action_to_str(action):
-        return "%s %s %s %s %s %s" % (action.piece.color, action.piece.type, action.file,
-                                      action.rank, action.promotion, action.capture)
 
-    def add_to_table(action):
-        action_str = action_to_str(action)
-        try:
-            history_table[hash(action_str)] += 1
-        except KeyError:
-            history_table[hash(action_str)] = 1
-
-    # noinspection PyShadowingNames,PyUnboundLocalVariable
-    def max_value(state, alpha, beta, depth, max_depth):  # returns a utility value
-        """ Selects the maximum value for the utility of a state resulting from a move by the AI player """
-        if terminal_test(state):
-            return utility(state, player)
-
-        if depth == max_depth:
-            # TODO: Quiescence search.
-            if state.nonquiescent:
-                # Is still max because it's called on the same state, not the resultant state.
-                return max_value_quiescence(state, alpha, beta, depth=0, max_depth=2)
+# noinspection PyUnboundLocalVariable
+def mini_max_decision(state, table, time_limit=MAX_TURN_TIME, options=None, first_depth=1, stop_event=None,
+                      verbose=True, search_moves=None, last_depth=MAX_SEARCH_DEPTH, alpha_bound=None,
+                      split_pool=None, ordering=None, expected_move=None):  # returns an action
+    """ Decides what move to take by a negamax search with principal variation search, deepened one ply at a time
+        until the time budget is spent. Every score is from the point of view of the player to move.
+
+        :param state: State to move from
+        :param table: TranspositionTable to look up and record search results in, unused with split_pool
+        :param time_limit: seconds to search for
+        :param options: dict of selective search options, DEFAULT_SEARCH_OPTIONS by default
+        :param first_depth: depth of the first iteration
+        :param stop_event: multiprocessing.Event that ends the search early once set
+        :param verbose: whether to print the progress of the search
+        :param search_moves: moves to consider at the root, every legal move when None
+        :param last_depth: depth of the last iteration
+        :param alpha_bound: multiprocessing.Value holding the best root score other processes have found, which the
+                            root moves only need to be proven better or worse than
+        :param split_pool: RootSplitPool to divide the root moves of every iteration between, instead of searching
+                           in this process
+        :param ordering: MoveOrdering to keep killer and history moves in, a new one when None
+        :param expected_move: move to search first at the root until an iteration finds the best move
+        :return tuple (move, utility, depth, principal variation) of the deepest completed iteration, depth 0 when
+                no iteration was completed
+    """
+    global start_time, states_checked, quiescence_states_checked
+    start_time = time.time()
+    states_checked = 0
+    quiescence_states_checked = 0
+    if ordering is None:
+        ordering = MoveOrdering()
+    if options is None:
+        options = DEFAULT_SEARCH_OPTIONS
+    null_move = options["null_move"]
+    null_move_min_depth = options["null_move_min_depth"]
+    null_move_reduction = options["null_move_reduction"]
+    lmr = options["lmr"]
+    lmr_min_depth = options["lmr_min_depth"]
+    lmr_min_moves = options["lmr_min_moves"]
+    reductions = reduction_table(options)
+    futility = options["futility"]
+    futility_margins = [0, options["futility_margin_1"], options["futility_margin_2"]]
+    razoring = options["razoring"]
+    razor_depth = options["razor_depth"]
+    razor_margin = options["razor_margin"]
+    lmp = options["lmp"]
+    lmp_depth = options["lmp_depth"]
+    lmp_counts = [options["lmp_base"] + depth * depth for depth in range(lmp_depth + 1)]
+    # Best move at the root of the iteration in progress, once it is fully searched
+    root_best = [None, -infinity]
+    # Aspiration window statistics: iterations searched with a window and the re-searches they needed
+    aspiration_stats = {"searches": 0, "fail_lows": 0, "fail_highs": 0}
+
+    def report(message):
+        if verbose:
+            print(message)
+
+    report("MiniMax Decision")
+
+    def check_time():
+        global states_checked
+        states_checked += 1
+        if states_checked % TIME_CHECK_INTERVAL == 0 and \
+                (time.time() - start_time > time_limit or (stop_event is not None and stop_event.is_set())):
+            raise SearchTimeout()
+
+    # noinspection PyShadowingNames
+    def negamax(state, alpha, beta, depth, ply, pv):
+        """ Principal variation search: the first move is searched with the full window, the rest with a null window
+            that only proves them worse, re-searching any that turn out better.
+
+            :param depth: remaining plies to search before quiescence
+            :param ply: plies from the root
+            :param pv: list to fill with the best line found from this position
+            :return int value of the position for the player to move
+        """
+        check_time()
+        if ply > 0 and draw_test(state):
+            return 0
+        if depth <= 0:
+            return quiescence(state, alpha, beta, ply)
+
+        pv_node = beta - alpha > 1
+        hash_move = None
+        entry = table.probe(state.hash)
+        if entry is not None:
+            hash_move, entry_depth, bound, score = entry
+            score = score_from_table(score, ply)
+            # The principal variation is left to be searched so that it is collected in full
+            if not pv_node and entry_depth >= depth:
+                if bound == EXACT or (bound == LOWER and score >= beta) or (bound == UPPER and score <= alpha):
+                    return score
+        if ply == 0 and not hash_move:
+            hash_move = root_best[0] or last_depth_best
+
+        in_check = state.in_check
+        static = utility(state, to_move(state))
+        # Frontier pruning trusts the static evaluation, so it is left out in check, at PV nodes and around mates
+        frontier = not pv_node and not in_check and abs(alpha) < MATE_THRESHOLD and abs(beta) < MATE_THRESHOLD
+
+        if razoring and frontier and depth <= razor_depth and static + razor_margin * depth < alpha:
+            if depth == 1:
+                return quiescence(state, alpha, beta, ply)
+            score = quiescence(state, alpha, alpha + 1, ply)
+            if score <= alpha:
+                return score
+
+        if null_move and not pv_node and not in_check and depth >= null_move_min_depth and \
+                state.last_move != NULL_MOVE and state.has_non_pawn_material and static >= beta:
+            # With only pawns and the king the player to move may be in zugzwang, where passing would be best
+            state.make_null_move()
+            score = -negamax(state, -beta, -beta + 1, depth - 1 - null_move_reduction, ply + 1, [])
+            state.unmake_null_move()
+            if score >= beta:
+                return beta if score >= MATE_THRESHOLD else score  # A mate after passing is not to be trusted
+
+        original_alpha = alpha
+        best = -infinity
+        best_action = None
+        child_pv = []
+        quiets_tried = []
+        us = state.side_to_move
+        killers = ordering.killers[ply]
+        moves_tried = 0
+        futile = futility and frontier and depth <= 2 and static + futility_margins[depth] <= alpha
+        prune_late = lmp and frontier and depth <= lmp_depth
+        for a in actions(state, hash_move, killers, ordering.history_key(us)):
+            if ply == 0:
+                if search_moves is not None and a not in search_moves:
+                    continue
+                if alpha_bound is not None and alpha_bound.value > alpha:
+                    alpha = original_alpha = alpha_bound.value
+            del child_pv[:]
+            state.make_move(a)
+            moves_tried += 1
+            if (futile or (prune_late and moves_tried > lmp_counts[depth])) and best_action is not None and \
+                    not is_tactical(a) and not state.in_check:
+                # A quiet move that cannot raise the score enough, or a late one at a shallow depth
+                state.unmake_move()
+                continue
+            if best_action is None:
+                score = -negamax(state, -beta, -alpha, depth - 1, ply + 1, child_pv)
             else:
-                return utility(state, player)
-
-        v = -infinity
-        action_list = actions(state)
-        best_action = action_list[0]
-        action_list.sort(key=lambda x: history_table.get(x, 0), reverse=True)
-        for a in action_list:
-            if time.time() - start_time > MAX_TURN_TIME:
-                break
-            mv = min_value(result(state, a), alpha, beta, depth + 1, max_depth)
-            if mv > v:  # Will always trigger on the first run
-                v = mv
-                best_action = a
-            if v >= beta:
-                add_to_table(best_action)
-                return v
-            alpha = max(alpha, v)
-        add_to_table(best_action)
-        return v
-
-    # noinspection PyShadowingNames,PyUnboundLocalVariable
-    def min_value(state, alpha, beta, depth, max_depth):  # returns a utility value
-        """ Selects the minimum value for the utility of a state resulting from a move by the enemy player """
-        if terminal_test(state) or depth == max_depth:
-            return utility(state, player)
-        v = infinity
-        action_list = actions(state)
-        best_action = action_list[0]
-        action_list.sort(key=lambda x: history_table.get(x, 0), reverse=True)
-        for a in action_list:
-            if time.time() - start_time > MAX_TURN_TIME:
-                break
-            mv = max_value(result(state, a), alpha, beta, depth + 1, max_depth)
-            if mv < v:
-                v = mv
+                reduction = 0
+                if lmr and depth >= lmr_min_depth and moves_tried > lmr_min_moves and not in_check and \
+                        not is_tactical(a) and a not in killers and not state.in_check:
+                    reduction = reductions[depth][min(moves_tried, 63)]
+                    if pv_node:
+                        reduction -= 1
+                    reduction = min(max(reduction, 0), depth - 1)
+                score = -negamax(state, -alpha - 1, -alpha, depth - 1 - reduction, ply + 1, child_pv)
+                if reduction and score > alpha:
+                    score = -negamax(state, -alpha - 1, -alpha, depth - 1, ply + 1, child_pv)
+                if alpha < score < beta:
+                    score = -negamax(state, -beta, -alpha, depth - 1, ply + 1, child_pv)
+            state.unmake_move()
+            if score > best:
+                best = score
                 best_action = a
-            if v <= alpha:
-                add_to_table(best_action)
-                return v
-            beta = min(beta, v)
-        add_to_table(best_action)
-        return v
-
-    # noinspection PyShadowingNames,PyUnboundLocalVariable
-    def max_value_quiescence(state, alpha, beta, depth, max_depth):
-        v = -infinity
-        if terminal_test(state) or depth == max_depth or not state.nonquiescent:
-            return utility(state, player)
-
-        action_list = actions(state)
-        best_action = action_list[0]
-        action_list.sort(key=lambda x: history_table.get(x, 0), reverse=True)
-        for a in action_list:
-            if time.time() - start_time > MAX_TURN_TIME:
-                break
-            mv = min_value_quiescence(result(state, a), alpha, beta, depth + 1, max_depth)
-            if mv > v:
-                v = mv
-                best_action = a
-            if v >= beta:
-                add_to_table(best_action)
-                return v
-            alpha = max(alpha, v)
-        add_to_table(best_action)
-        return v
-
-    # noinspection PyShadowingNames,PyUnboundLocalVariable
-    def min_value_quiescence(state, alpha, beta, depth, max_depth):
-        if terminal_test(state) or depth == max_depth or not state.nonquiescent:
-            return utility(state, player)
-
-        v = infinity
-        action_list = actions(state)
-        best_action = action_list[0]
-        action_list.sort(key=lambda x: history_table.get(x, 0), reverse=True)
-        for a in action_list:
-            if time.time() - start_time > MAX_TURN_TIME:
-                break
-            mv = max_value(result(state, a), alpha, beta, depth + 1, max_depth)
-            if mv < v:
-                v = mv
-                best_action = a
-            if v <= alpha:
-                add_to_table(best_action)
-                return v
-            beta = min(beta, v)
-        add_to_table(best_action)
-
-        return v
-
-    for m_depth in range(2):
-        max_depth = m_depth + 1
-        print("Max depth of %s" % max_depth)
-        max_utility = -infinity
-        action_list = actions(state)
-        action_list.sort(key=lambda x: history_table.get(x, 0), reverse=True)
-        for a in action_list:
-            if time.time() - start_time > MAX_TURN_TIME:
-                break
-            min_utility = min_value(result(state, a), -infinity, infinity, 0, max_depth)
-            if min_utility > max_utility:  # Guaranteed to trigger on first completion of min_value
-                max_utility = min_utility
-                best_action = a
-        last_depth_best = best_action
-    print("Time used: %s" % (time.time() - start_time))
-    return last_depth_best, max_utility
+                if score > alpha:
+                    if ply == 0:
+                        root_best[:] = [a, score]  # Moves that fail low at the root only have an upper bound
+                        if alpha_bound is not None:
+                            with alpha_bound.get_lock():
+                                alpha_bound.value = max(alpha_bound.value, score)
+                    alpha = score
+                    pv[:] = [a] + child_pv
+                    if alpha >= beta:
+                        if not is_tactical(a):
+                            ordering.cutoff(us, a, depth, ply, quiets_tried)
+                        break
+            if not is_tactical(a):
+                quiets_tried.append(a)
+        if best_action is None:
+            return terminal_utility(state, to_move(state), ply)
+
+        bound = LOWER if best >= beta else UPPER if best <= original_alpha else EXACT
+        table.store(state.hash, best_action, depth, bound, score_to_table(best, ply))
+        return best
+
+    # noinspection PyShadowingNames
+    def quiescence(state, alpha, beta, ply):
+        """ Searches captures and promotions past the horizon until the position is quiet, so that the static
+            evaluation is never taken in the middle of an exchange. The player to move may instead stand pat on
+            the static evaluation, except when in check, where every evasion is searched.
+        """
+        global quiescence_states_checked
+        quiescence_states_checked += 1
+        check_time()
+        if draw_test(state):
+            return 0
+
+        in_check = state.in_check
+        if in_check:
+            best = -infinity
+            # Evasions are few, so they are ordered together by a single score
+            moves = sorted(actions(state), key=lambda m: ordering.score(state, m, ply=ply), reverse=True)
+        else:
+            best = stand_pat = utility(state, to_move(state))
+            if best >= beta or ply >= MAX_SEARCH_DEPTH:
+                return best
+            if best > alpha:
+                alpha = best
+            moves = tactical_actions(state)
+
+        for a in moves:
+            if not in_check:
+                if stand_pat + state.material_gain(a) + DELTA_MARGIN <= alpha:
+                    continue  # Delta pruning: even winning the piece cannot raise alpha
+                if not is_promotion(a) and state.see(a) < 0:
+                    continue  # Loses material once the recaptures are made
+            state.make_move(a)
+            score = -quiescence(state, -beta, -alpha, ply + 1)
+            state.unmake_move()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        if best == -infinity:
+            return terminal_utility(state, to_move(state), ply)  # Checkmated
+        return best
+
+    def aspiration_search(depth, previous, pv):
+        """ Searches the root to the given depth in a window around the previous iteration's score, widening it on
+            the failing side until the score lands inside.
+        """
+        if not options["aspiration"] or depth == 1 or abs(previous) >= MATE_THRESHOLD:
+            return negamax(state, -infinity, infinity, depth, 0, pv)
+
+        aspiration_stats["searches"] += 1
+        delta = options["aspiration_window"]
+        alpha = previous - delta
+        beta = previous + delta
+        while True:
+            score = negamax(state, alpha, beta, depth, 0, pv)
+            if score <= alpha:
+                aspiration_stats["fail_lows"] += 1
+                alpha = score - delta if delta < MATE_THRESHOLD else -infinity
+            elif score >= beta:
+                aspiration_stats["fail_highs"] += 1
+                beta = score + delta if delta < MATE_THRESHOLD else infinity
+            else:
+                return score
+            delta *= 2
 
+    def split_search(depth, pv):
+        """ Searches the root moves to the given depth in the processes of split_pool, the previous best move first.
+            An iteration any process could not finish is abandoned as a whole.
+        """
+        global states_checked, quiescence_states_checked
+        root_moves.sort(key=lambda m: m != last_depth_best)
+        results = split_pool.search(state.fen, root_moves, depth, time_limit - (time.time() - start_time), options)
+        states_checked += sum(result[4] for result in results)
+        quiescence_states_checked += sum(result[5] for result in results)
+        if any(result[0] < depth for result in results):
+            raise SearchTimeout()
+        # Each process only reports moves better than what every process had found, so the best of them is exact
+        _, move, score, line, _, _ = max((result for result in results if result[1] is not None), key=lambda r: r[2])
+        root_best[:] = [move, score]
+        pv[:] = line
+
+    root_moves = list(actions(state)) if search_moves is None else list(search_moves)
+    if len(root_moves) == 1 and search_moves is None:
+        return root_moves[0], utility(state, to_move(state)), 0, root_moves  # Nothing to decide
+
+    root_ply = state.ply
+    last_depth_best = root_moves[0] if root_moves else None
+    if expected_move in root_moves:
+        last_depth_best = expected_move
+    last_depth_utility = -infinity
+    completed_depth = 0
+    principal_variation = []
+    for max_depth in range(first_depth, last_depth + 1):
+        root_best[:] = [None, -infinity]
+        ordering.age()
+        pv = []
+        try:
+            if split_pool is not None:
+                split_search(max_depth, pv)
+            else:
+                aspiration_search(max_depth, last_depth_utility, pv)
+        except SearchTimeout:
+            while state.ply > root_ply:
+                if state.last_move == NULL_MOVE:
+                    state.unmake_null_move()
+                else:
+                    state.unmake_move()
+            # The previous best move is searched first and later moves only replace it once proven better,
+            # so the abandoned iteration's best so far can be trusted
+            if root_best[0] is not None:
+                last_depth_best, last_depth_utility = root_best
+            report("Depth %s abandoned" % max_depth)
+            break
+
+        last_depth_best, last_depth_utility = root_best
+        completed_depth = max_depth
+        principal_variation = pv
+        report("Depth %s: %s %s (%s states, %s in quiescence, %.2fs)" %
+               (max_depth, last_depth_utility, " ".join(map(move_to_str, pv)), states_checked,
+                quiescence_states_checked, time.time() - start_time))
+        if abs(last_depth_utility) >= MATE_THRESHOLD:
+            break  # A forced mate has been found
+        if time.time() - start_time > time_limit / 2:
+            break  # The next iteration would not finish
+    if aspiration_stats["searches"]:
+        report("Aspiration: %(searches)s windowed iterations, %(fail_lows)s fail lows, %(fail_highs)s fail highs" %
+               aspiration_stats)
+    report("Time used: %s" % (time.time() - start_time))
+    return last_depth_best, last_depth_utility, completed_depth, principal_variation
+
+
+def lazy_smp_decision(state, table, processes, time_limit=MAX_TURN_TIME, options=None, helpers=(), ordering=None,
+                      expected_move=None):
+    """ Lazy SMP: searches the same position in several processes at once, sharing one transposition table.
+        The helper processes start one or two plies deeper than the main search, so that they reach different parts
+        of the tree first and fill the table with results the others then find. The move of the deepest completed
+        iteration is played, the main search's when depths are equal.
+
+        :param state: State to move from
+        :param table: SharedTranspositionTable the processes search with
+        :param processes: int number of processes searching, including this one
+        :param time_limit: seconds to search for
+        :param options: dict of selective search options, DEFAULT_SEARCH_OPTIONS by default
+        :param helpers: SearchProcesses already searching the position, which join in as extra helpers
+        :param ordering: MoveOrdering of the main search, a new one when None
+        :param expected_move: move for the main search to try first at the root
+        :return tuple (move, utility, depth, principal variation) of the deepest completed iteration
+    """
+    fen = state.fen
+    helpers = list(helpers) + [SearchProcess(fen, table, time_limit, options, 2 + i % 2)
+                               for i in range(processes - 1)]
+
+    try:
+        move, score, depth, line = mini_max_decision(state, table, time_limit, options, ordering=ordering,
+                                                     expected_move=expected_move)
+        best = (depth, move, score, line)
+    finally:
+        for helper in helpers:
+            helper.stop()
+
+    deadline = time.time() + WORKER_STOP_TIME
+    for helper in helpers:
+        result = helper.result(max(0, deadline - time.time()))
+        if result[0] > best[0]:
+            best = result
+    print("Lazy SMP: depth %s from %s processes" % (best[0], len(helpers) + 1))
+    depth, move, score, line = best
+    return move, score, depth, line
+
+
+class SearchProcess:
+    def __init__(self, fen, table, time_limit, options, first_depth=1):
+        """ Searches a position in a process of its own with lazy_smp_worker, until told to stop.
+
+            :param fen: str the position to search
+            :param table: SharedTranspositionTable to search with
+            :param time_limit: seconds to search for at most
+            :param options: dict of selective search options
+            :param first_depth: depth of the first iteration
+        """
+        context = multiprocessing.get_context()
+        self.stop_event = context.Event()
+        self.results = context.Queue()
+        self.process = context.Process(target=lazy_smp_worker, daemon=True,
+                                       args=(fen, table.name, table.size_mb, table.age, time_limit, options,
+                                             first_depth, self.stop_event, self.results))
+        self.process.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def result(self, timeout=WORKER_STOP_TIME):
+        """ Waits for the search to report, ending the process if it does not within timeout seconds.
+
+            :return tuple (completed depth, move, utility, principal variation), (0, None, None, []) if the search
+                    did not report
+        """
+        try:
+            result = self.results.get(timeout=timeout)
+        except queue.Empty:
+            result = (0, None, None, [])
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        return result
+
+
+def lazy_smp_worker(fen, table_name, size_mb, age, time_limit, options, first_depth, stop_event, results):
+    """ Helper process of lazy_smp_decision: searches the position until told to stop and puts
+        (completed depth, move, utility, principal variation) on the results queue.
+    """
+    table = SharedTranspositionTable(size_mb, table_name)
+    table.age = age
+    try:
+        move, score, depth, line = mini_max_decision(State(fen=fen), table, time_limit, options, first_depth,
+                                                     stop_event, verbose=False)
+        results.put((depth, move, score, line))
+    except Exception as error:
+        print("Search process failed: %s" % error)
+        results.put((0, None, None, []))
+    finally:
+        table.close()
+
+
+class RootSplitPool:
+    def __init__(self, processes, size_mb=DEFAULT_SIZE_MB):
+        """ Processes that divide the moves at the root between them, each searching its share with its own
+            transposition table. They start with the pool and last until it is shut down, so their tables stay warm
+            from one iteration and turn to the next.
+
+            :param processes: int number of processes
+            :param size_mb: size in megabytes of the transposition table of each process
+        """
+        context = multiprocessing.get_context()
+        self.processes = processes
+        self.alpha_bound = context.Value("i", NO_SCORE)
+        self.executor = ProcessPoolExecutor(processes, mp_context=context, initializer=init_split_worker,
+                                            initargs=(size_mb, self.alpha_bound))
+        # Wait for every process to start
+        for future in [self.executor.submit(time.sleep, 0.1) for _ in range(processes)]:
+            future.result()
+
+    def search(self, fen, moves, depth, time_limit, options):
+        """ Searches moves of the position to depth, dealing them out to the processes in turn.
+
+            :return list of (completed depth, move, utility, principal variation, states, quiescence states) from
+                    each process, the move is None if none of its share beat the best score of the others
+        """
+        self.alpha_bound.value = NO_SCORE
+        futures = [self.executor.submit(search_root_moves, fen, moves[i::self.processes], depth, time_limit, options)
+                   for i in range(min(self.processes, len(moves)))]
+        return [future.result() for future in futures]
 
-def actions(state):
-    """"Return a list of the allowable moves at this point."""
-    return state.moves
+    def shutdown(self):
+        self.executor.shutdown()
 
 
-def result(state, move):
-    """Return the state that results from making a move from a state."""
-    if move not in state.moves:
-        return state
-    return state.move_result(action=move)
+# Transposition table and shared root score of a RootSplitPool process, and the position it last searched
+split_table = None
+split_alpha_bound = None
+split_root = None
+
+
+def init_split_worker(size_mb, alpha_bound):
+    global split_table, split_alpha_bound
+    split_table = TranspositionTable(size_mb)
+    split_alpha_bound = alpha_bound
+
 
+def search_root_moves(fen, moves, depth, time_limit, options):
+    """ Searches some root moves in a RootSplitPool process.
 
-def terminal_test(state):
-    """"Return True if this is a final state for the game."""
-    return state.terminal
+        :return tuple (completed depth, move, utility, principal variation, states, quiescence states)
+    """
+    global split_root
+    if fen != split_root:
+        split_root = fen
+        split_table.new_search()
+    move, score, completed_depth, line = mini_max_decision(State(fen=fen), split_table, time_limit, options,
+                                                           first_depth=depth, verbose=False, search_moves=moves,
+                                                           last_depth=depth, alpha_bound=split_alpha_bound)
+    return completed_depth, move, score, line, states_checked, quiescence_states_checked
+
+
+def score_to_table(score, ply):
+    """ Mate scores are stored as distance from the position rather than from the root """
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+def actions(state, hash_move=None, killers=(), quiet_key=None):
+    """"Return the allowable moves at this point, generated lazily in order of promise."""
+    return state.generate_moves(hash_move, killers, quiet_key)
+
+
+def tactical_actions(state):
+    """"Return the captures and promotions allowable at this point, most promising first."""
+    return state.tactical_moves()
+
+
+def draw_test(state):
+    """"Return True if the game is drawn at this state without needing to generate its moves."""
+    return state.draw
 
 
 def to_move(state):
@@ -300,3 +856,11 @@ def to_move(state):
 def utility(state, player):
     """"Return the value of this final state to player."""
     return state.utility if player == state.to_move else -state.utility
+
+
+def terminal_utility(state, player, ply=0):
+    """"Return the value to player of a state where the player to move has no moves: checkmate or stalemate.
+        Checkmates found fewer plies from the root are worth more.
+    """
+    value = ply - CHECKMATE_UTILITY if state.in_check else 0
+    return value if player == state.to_move else -value
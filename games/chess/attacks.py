@@ -0,0 +1,139 @@
+""" Attack tables built once at import time.
+
+    Leaper attacks (knight, king, pawn) are looked up directly per square. Sliding attacks are served from a
+    ray per direction and square: the ray is cut at the first blocker by removing that blocker's own ray.
+"""
+from games.chess.bitboard import *
+
+# Directions, ordered so that the first four step towards higher square indices
+NORTH = 0
+EAST = 1
+NORTH_EAST = 2
+NORTH_WEST = 3
+SOUTH = 4
+WEST = 5
+SOUTH_WEST = 6
+SOUTH_EAST = 7
+DIRECTION_STEPS = [(0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1)]
+
+KNIGHT_STEPS = [(2, 1), (2, -1), (-1, -2), (1, -2), (-2, -1), (-2, 1), (-1, 2), (1, 2)]
+KING_STEPS = DIRECTION_STEPS
+
+
+def _leaper_attacks(steps):
+    table = []
+    for sq in range(64):
+        x, y = square_x(sq), square_y(sq)
+        bb = EMPTY
+        for dx, dy in steps:
+            if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+                bb |= BITS[square(x + dx, y + dy)]
+        table.append(bb)
+    return table
+
+
+def _ray(sq, dx, dy):
+    x, y = square_x(sq) + dx, square_y(sq) + dy
+    bb = EMPTY
+    while 0 <= x < 8 and 0 <= y < 8:
+        bb |= BITS[square(x, y)]
+        x += dx
+        y += dy
+    return bb
+
+
+KNIGHT_ATTACKS = _leaper_attacks(KNIGHT_STEPS)
+KING_ATTACKS = _leaper_attacks(KING_STEPS)
+# PAWN_ATTACKS[color][sq] is the set of squares a pawn of that color on sq attacks
+PAWN_ATTACKS = [_leaper_attacks([(-1, 1), (1, 1)]), _leaper_attacks([(-1, -1), (1, -1)])]
+# RAYS[direction][sq] is every square from sq (exclusive) to the edge of the board in that direction
+RAYS = [[_ray(sq, dx, dy) for sq in range(64)] for dx, dy in DIRECTION_STEPS]
+
+
+def _between_and_line():
+    between = [[EMPTY] * 64 for _ in range(64)]
+    line = [[EMPTY] * 64 for _ in range(64)]
+    for a in range(64):
+        for direction, (dx, dy) in enumerate(DIRECTION_STEPS):
+            full_line = RAYS[direction][a] | RAYS[(direction + 4) % 8][a] | BITS[a]
+            x, y = square_x(a) + dx, square_y(a) + dy
+            passed = EMPTY
+            while 0 <= x < 8 and 0 <= y < 8:
+                b = square(x, y)
+                between[a][b] = passed
+                line[a][b] = full_line
+                passed |= BITS[b]
+                x += dx
+                y += dy
+    return between, line
+
+
+# BETWEEN[a][b] is the squares strictly between two aligned squares, LINE[a][b] the whole line through both.
+# Both are empty when the squares do not share a rank, file or diagonal.
+BETWEEN, LINE = _between_and_line()
+
+
+def ray_attacks(direction, sq, occupied):
+    """ :return bitboard of squares attacked from sq in one direction, up to and including the first blocker """
+    attacks = RAYS[direction][sq]
+    blockers = attacks & occupied
+    if blockers:
+        if direction < SOUTH:
+            attacks ^= RAYS[direction][(blockers & -blockers).bit_length() - 1]
+        else:
+            attacks ^= RAYS[direction][blockers.bit_length() - 1]
+    return attacks
+
+
+def bishop_attacks(sq, occupied):
+    return (ray_attacks(NORTH_EAST, sq, occupied) | ray_attacks(NORTH_WEST, sq, occupied) |
+            ray_attacks(SOUTH_WEST, sq, occupied) | ray_attacks(SOUTH_EAST, sq, occupied))
+
+
+def rook_attacks(sq, occupied):
+    return (ray_attacks(NORTH, sq, occupied) | ray_attacks(EAST, sq, occupied) |
+            ray_attacks(SOUTH, sq, occupied) | ray_attacks(WEST, sq, occupied))
+
+
+def queen_attacks(sq, occupied):
+    return bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)
+
+
+def attackers_to(pieces, color, sq, occupied):
+    """ :param pieces: per-type bitboards of the attacking side, i.e. Board.pieces[color]
+        :param color: int color of the attacking side
+        :param sq: int target square
+        :param occupied: bitboard of occupied squares to use for sliding pieces
+        :return bitboard of that side's pieces attacking sq
+    """
+    queens = pieces[QUEEN]
+    return ((KNIGHT_ATTACKS[sq] & pieces[KNIGHT]) |
+            (KING_ATTACKS[sq] & pieces[KING]) |
+            (PAWN_ATTACKS[1 - color][sq] & pieces[PAWN]) |
+            (bishop_attacks(sq, occupied) & (pieces[BISHOP] | queens)) |
+            (rook_attacks(sq, occupied) & (pieces[ROOK] | queens)))
+
+
+def pawn_attack_map(pawns, color):
+    """ :return bitboard of every square attacked by the given pawns of a color """
+    if color == WHITE:
+        return (((pawns & ~FILE_A) << 7) | ((pawns & ~FILE_H) << 9)) & FULL
+    return ((pawns & ~FILE_A) >> 9) | ((pawns & ~FILE_H) >> 7)
+
+
+def attack_map(pieces, color, occupied):
+    """ :param pieces: per-type bitboards of the attacking side, i.e. Board.pieces[color]
+        :param color: int color of the attacking side
+        :param occupied: bitboard of occupied squares to use for sliding pieces
+        :return bitboard of every square attacked by that side
+    """
+    attacked = pawn_attack_map(pieces[PAWN], color)
+    for sq in iter_bits(pieces[KNIGHT]):
+        attacked |= KNIGHT_ATTACKS[sq]
+    for sq in iter_bits(pieces[BISHOP] | pieces[QUEEN]):
+        attacked |= bishop_attacks(sq, occupied)
+    for sq in iter_bits(pieces[ROOK] | pieces[QUEEN]):
+        attacked |= rook_attacks(sq, occupied)
+    for sq in iter_bits(pieces[KING]):
+        attacked |= KING_ATTACKS[sq]
+    return attacked
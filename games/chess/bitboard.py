@@ -0,0 +1,69 @@
+""" Bitboard primitives shared by the position, move generation and search code.
+
+    Squares are numbered 0-63 with a1 = 0, h1 = 7, a8 = 56 and h8 = 63, so that a square is always
+    ``y * 8 + x`` for the (x, y) coordinates returned by ``get_coordinates``.
+"""
+
+WHITE = 0
+BLACK = 1
+COLORS = ["White", "Black"]
+
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+PIECE_TYPES = ["Pawn", "Knight", "Bishop", "Rook", "Queen", "King"]
+PIECE_CHARS = "pnbrqk"
+FILE_CHARS = "abcdefgh"
+
+FULL = (1 << 64) - 1
+EMPTY = 0
+
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+
+BITS = [1 << sq for sq in range(64)]
+
+
+def square(x, y):
+    """ :return int square index of the given (x, y) coordinates """
+    return y * 8 + x
+
+
+def square_x(sq):
+    return sq & 7
+
+
+def square_y(sq):
+    return sq >> 3
+
+
+def lsb(bb):
+    """ :return int index of the least significant set bit of a non-empty bitboard """
+    return (bb & -bb).bit_length() - 1
+
+
+def popcount(bb):
+    return bin(bb).count("1")
+
+
+def iter_bits(bb):
+    """ Yields the square index of every set bit, least significant first. """
+    while bb:
+        b = bb & -bb
+        yield b.bit_length() - 1
+        bb ^= b
+
+
+def piece_code(color, piece_type):
+    """ Packs a color and piece type into the single int stored in the board's square array. """
+    return color * 6 + piece_type
+
+
+CODE_COLOR = [WHITE] * 6 + [BLACK] * 6
+CODE_TYPE = list(range(6)) * 2
+CODE_CHARS = PIECE_CHARS.upper() + PIECE_CHARS
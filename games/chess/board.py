@@ -1,53 +1,61 @@
+from games.chess.bitboard import *
 from games.chess.chess import get_coordinates
 
 
-class Board(list):
-    def __init__(self, fen=None, board=None):
-        """
+class Board:
+    __slots__ = ["width", "height", "pieces", "occupancy", "squares"]
+
+    def __init__(self, fen=None, pieces=None):
+        """ Bitboard representation of the piece placement: one 64-bit integer per piece type and color,
+            an occupancy mask per color, and a square-indexed array of piece codes for direct lookups.
+            The square array is the search's only record of individual pieces.
+
         :param fen: String adhering to Forsyth-Edwards Notation format.
+        :param pieces: iterable of the server's Piece objects still on the board.
         """
-        super().__init__()
         self.width = 8
         self.height = 8
         if fen is not None:
             self.__generate_from_fen(fen)
-            self._fen = fen
-        elif board is not None:
-            # Initial state
-            self.__generate_from_board(board)
-            self._fen = self.__create_fen()
+        elif pieces is not None:
+            self.__generate_from_pieces(pieces)
         else:
-            raise ValueError("Must pass a FEN or a Board to create a Board from")
+            raise ValueError("Must pass a FEN or pieces to create a Board from")
 
     def __hash__(self):
-        return hash(self.fen)
+        return hash(tuple(self.squares))
 
     @property
     def fen(self):
-        return self._fen
+        """ Piece placement field of the Forsyth-Edwards Notation, built on demand. Not for use during search. """
+        return self.__create_fen()
+
+    @property
+    def occupied(self):
+        return self.occupancy[WHITE] | self.occupancy[BLACK]
 
     def __create_fen(self):
-        fen = ""
-        placeholder = [[y for y in self[x]] for x in range(len(self))]
-        placeholder = list(map(list, zip(*placeholder)))
-        placeholder.reverse()
-        # Board should be oriented for proper display here
-        for r in placeholder:
-            for c in r:
-                count = 0
-                if c.isdigit():
-                    count += 1
+        rows = []
+        for y in range(7, -1, -1):
+            row = ""
+            empty = 0
+            for code in self.squares[y * 8:y * 8 + 8]:
+                if code is None:
+                    empty += 1
                 else:
-                    if count != 0:
-                        fen += count
-                    fen += c
-            fen += "/"
-        fen.rstrip("/")
-        return fen
-
-    def copy(self):
-        """ Creates a copy of the current board using the Forsyth-Edwards Notation representation of the board """
-        return Board(board=self)
+                    if empty:
+                        row += str(empty)
+                        empty = 0
+                    row += CODE_CHARS[code]
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        return "/".join(rows)
+
+    def __clear(self):
+        self.pieces = [[EMPTY] * 6, [EMPTY] * 6]
+        self.occupancy = [EMPTY, EMPTY]
+        self.squares = [None] * 64
 
     def __generate_from_fen(self, fen):
         """
@@ -55,76 +63,54 @@ class Board(list):
         :param fen: Forsyth-Edwards Notation representation of board state
         :return: No return value. Simply modified the called Board to represent the given FEN string
         """
-        del self[:]
+        self.__clear()
         fen_pieces = fen.split(" ")[0]  # Strips FEN of non-location info
-        row_lists = fen_pieces.split("/")
-        placeholder = []
-        for r in row_lists:
-            row = []
+        rows = fen_pieces.split("/")
+        if len(rows) != 8:
+            raise ValueError("FEN piece placement must have 8 ranks: %s" % fen_pieces)
+        # Ranks are listed from 8 descending to 1
+        for y, r in enumerate(reversed(rows)):
+            x = 0
             for c in r:
                 if c.isdigit():
-                    for _ in range(int(c)):
-                        row.append("")
+                    x += int(c)
                 else:
-                    row.append(c)
-            placeholder.append(row)
-        # This implementation actually puts ranks 8 descending in list first
-        # [r8, r7, r6, r5, r4, r3, r2, r1]
-        # Must be reversed to be able to address easily by rank.
-        # [r1, r2, r3, r4, r5, r6, r7, r8]
-        placeholder.reverse()
-        # Transpose to allow board[x][y] indexing instead of board[y][x]
-        placeholder = list(map(list, zip(*placeholder)))
-        [self.append(x) for x in placeholder]
-
-    def __generate_from_board(self, board):
-        [self.append([c for c in r]) for r in board]
-        assert len(self) == len(board)
-
-    def move_piece(self, xi=None, yi=None, xf=None, yf=None, ri=None, fi=None, rf=None, ff=None):
-        """ Moves the token marker for a piece from one space to another.
-            Simply a wrapper to handle moving either xy system or rank-file system
-
-            :param xi: int representing the initial x coordinate of the piece to be moved
-            :param yi: int representing the initial y coordinate of the piece to be moved
-            :param xf: int representing the final x coordinate of the piece to be moved
-            :param yf: int representing the final y coordinate of the piece to be moved
-
-            :param ri: int representing the initial rank of the piece to be moved
-            :param fi: chr representing the initial file of the piece to be moved
-            :param rf: int representing the final rank of the piece to be moved
-            :param ff: chr representing the final file of the piece to be moved
-        """
-        if xi is not None and yi is not None and xf is not None and yf is not None:
-            self.move_piece_xy(xi, yi, xf, yf)
-        elif ri is not None and fi is not None and rf is not None and ff is not None:
-            self.move_piece_rf(ri, fi, rf, ff)
-
-    def move_piece_rf(self, ri, fi, rf, ff):
-        """ Moves the token marker for a piece from one space to another.
-
-            :param ri: int representing the initial rank of the piece to be moved
-            :param fi: chr representing the initial file of the piece to be moved
-            :param rf: int representing the final rank of the piece to be moved
-            :param ff: chr representing the final file of the piece to be moved
-        """
-        xi, yi = get_coordinates(ri, fi)
-        xf, yf = get_coordinates(rf, ff)
-        self.move_piece_xy(xi, yi, xf, yf)
-
-    def move_piece_xy(self, xi, yi, xf, yf):
-        """ Moves the token marker for a piece from one space to another.
-
-            :param xi: int representing the initial x coordinate of the piece to be moved
-            :param yi: int representing the initial y coordinate of the piece to be moved
-            :param xf: int representing the final x coordinate of the piece to be moved
-            :param yf: int representing the final y coordinate of the piece to be moved
-        """
-        marker = self[xi][yi]
-        self[xi][yi] = ""
-        self[xf][yf] = marker
+                    if c not in CODE_CHARS or x > 7:
+                        raise ValueError("Invalid FEN piece placement: %s" % fen_pieces)
+                    self.put(y * 8 + x, CODE_CHARS.index(c))
+                    x += 1
+            if x != 8:
+                raise ValueError("FEN rank must span 8 files: %s" % r)
+
+    def __generate_from_pieces(self, pieces):
+        self.__clear()
+        for p in pieces:
+            x, y = get_coordinates(p.rank, p.file)
+            self.put(y * 8 + x, piece_code(COLORS.index(p.owner.color), PIECE_TYPES.index(p.type)))
+
+    def piece_at(self, x, y):
+        """ :return str Forsyth-Edwards Notation character of the piece at (x, y), or "" if the space is empty """
+        code = self.squares[y * 8 + x]
+        return "" if code is None else CODE_CHARS[code]
+
+    def put(self, sq, code):
+        """ Places the piece with the given piece code on an empty square """
+        b = BITS[sq]
+        self.pieces[CODE_COLOR[code]][CODE_TYPE[code]] |= b
+        self.occupancy[CODE_COLOR[code]] |= b
+        self.squares[sq] = code
+
+    def remove(self, sq):
+        """ Removes and returns the piece code on the given square """
+        code = self.squares[sq]
+        if code is not None:
+            b = BITS[sq]
+            self.pieces[CODE_COLOR[code]][CODE_TYPE[code]] ^= b
+            self.occupancy[CODE_COLOR[code]] ^= b
+            self.squares[sq] = None
+        return code
 
     def nice_print(self):
         print("========================")
-        [print(x) for x in self]
+        print("\n".join(" ".join(self.piece_at(x, y) or "." for x in range(8)) for y in range(7, -1, -1)))
         print("========================")
@@ -1,7 +1,3 @@
-from games.chess.game_object import GameObject
-from itertools import count
-
-
 def get_player(fen: str):
     return str(fen.split(" ")[1])
 
@@ -18,7 +14,7 @@ def get_en_passant_coordinates(fen: str):
         :return two-tuple containing the x and y coordinates of the en-passant target
     """
     target = fen.split(" ")[3]
-    if target is "-":
+    if target == "-":
         return None
     file, rank = list(target)
     rank = int(rank)
@@ -41,164 +37,6 @@ def get_file_rank(x, y):
     return tuple((file, rank))
 
 
-# noinspection PyAttributeOutsideInit
-class MyPiece(GameObject):
-    _ids = count(0)
-
-    def __init__(self, color, t, file, rank, has_moved, captured=False, pid=None):
-        GameObject.__init__(self)
-
-        self.file = file
-        self.has_moved = has_moved
-        self.__color = color
-        self.rank = rank
-        self.type = t
-        self.captured = captured
-        if pid is None:
-            self.__id = self._ids.__next__()
-        else:
-            self.__id = pid
-        self.__x, self.__y = get_coordinates(self.rank, self.file)
-        self.__space_color = "Black" if self.x + self.y % 2 == 0 else "White"
-        self._value = self.evaluate()
-
-    def __cmp__(self, other):
-        if self.value > other.value:
-            return 1
-        elif self.value == other.value:
-            return 0
-        else:
-            return -1
-
-    def copy(self):
-        return MyPiece(self.color, self.type, self.file, self.rank, self.has_moved, self.captured, self.id)
-
-    def evaluate(self, end_game=False):
-        assert self.type in ["Pawn", "Knight", "Bishop", "Rook", "Queen", "King"]
-        assert self.color in ["White", "Black"]
-        if self.captured is True:
-            return 0
-        if self.type == "Pawn":
-            if self.color == "White":
-                return 100 + WHITE_PAWN_EVAL[self.x][self.y]
-            else:  # if self.owner.color == "Black"
-                return 100 + BLACK_PAWN_EVAL[self.x][self.y]
-        elif self.type == "Knight":
-            if self.color == "White":
-                return 320 + WHITE_KNIGHT_EVAL[self.x][self.y]
-            else:  # if self.color == "Black"
-                return 320 + BLACK_KNIGHT_EVAL[self.x][self.y]
-        elif self.type == "Bishop":
-            if self.color == "White":
-                return 333 + WHITE_BISHOP_EVAL[self.x][self.y]
-            else:  # if self.owner.color == "Black"
-                return 333 + BLACK_BISHOP_EVAL[self.x][self.y]
-        elif self.type == "Rook":
-            if self.color == "White":
-                return 510 + WHITE_ROOK_EVAL[self.x][self.y]
-            else:  # if self.owner.color == "Black"
-                return 510 + BLACK_ROOK_EVAL[self.x][self.y]
-        elif self.type == "Queen":
-            if self.color == "White":
-                return 880 + WHITE_QUEEN_EVAL[self.x][self.y]
-            else:  # if self.owner.color == "Black"
-                return 880 + BLACK_QUEEN_EVAL[self.x][self.y]
-        if self.type == "King" and end_game is False:
-            if self.color == "White":
-                return 200000 + WHITE_KING_MID_EVAL[self.x][self.y]
-            else:  # if self.owner.color == "Black"
-                return 200000 + BLACK_KING_MID_EVAL[self.x][self.y]
-        elif self.type == "King" and end_game is True:
-            if self.color == "White":
-                return 200000 + WHITE_KING_END_EVAL[self.x][self.y]
-            else:  # if self.owner.color == "Black"
-                return 200000 + BLACK_KING_END_EVAL[self.x][self.y]
-
-    def move(self, file, rank, promotionType=""):
-        """ Moves the Piece from its current location to the given rank and file.
-
-        Args:
-            file (str): The file coordinate to move to. Must be [a-h].
-            rank (int): The rank coordinate to move to. Must be [1-8].
-            promotion_type (Optional[str]): If this is a Pawn moving to the end of the board then this parameter is what to promote it to. When used must be 'Queen', 'Knight', 'Rook', or 'Bishop'.
-
-        Returns:
-            Move: The Move you did if successful, otherwise None if invalid. In addition if your move was invalid you will lose.
-        """
-        return self._run_on_server('move', file=file, rank=rank, promotionType=promotionType)
-
-    @property
-    def captured(self):
-        return self.__captured
-
-    @captured.setter
-    def captured(self, c):
-        assert type(c) is bool
-        self.__captured = c
-
-    @property
-    def file(self):
-        return self.__file
-
-    @file.setter
-    def file(self, f):
-        assert type(f) is str
-        assert f in ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
-        self.__file = f
-
-    @property
-    def has_moved(self):
-        return self.__has_moved
-
-    @has_moved.setter
-    def has_moved(self, h):
-        assert type(h) is bool
-        self.__has_moved = h
-
-    @property
-    def id(self):
-        return self.__id
-
-    @property
-    def color(self):
-        return self.__color
-
-    @property
-    def rank(self):
-        return self.__rank
-
-    @rank.setter
-    def rank(self, r):
-        assert type(r) is int
-        assert 1 <= r <= 8
-        self.__rank = r
-
-    @property
-    def space_color(self):
-        return self.__space_color
-
-    @property
-    def type(self):
-        return self.__type
-
-    @type.setter
-    def type(self, t):
-        assert type(t) is str
-        assert t in ["Pawn", "Rook", "Knight", "Bishop", "Queen", "King"]
-        self.__type = t
-
-    @property
-    def value(self):
-        return self._value
-
-    @property
-    def x(self):
-        return self.__x
-
-    @property
-    def y(self):
-        return self.__y
-
 # ---------- PIECE EVALUATION MODIFIERS ----------
 
 BLACK_PAWN_EVAL = [[0, 50, 10, 5, 0, 5, 5, 0],
@@ -328,3 +166,32 @@ WHITE_KING_END_EVAL = [[-50, -30, -30, -30, -30, -30, -30, -50],
                        [-30, -30, -10, -10, -10, -10, -20, -40],
                        [-50, -30, -30, -30, -30, -30, -30, -50]]
 
+PIECE_VALUES = [100, 320, 333, 510, 880, 200000]
+
+# Piece-square tables indexed [color][piece type]
+MID_EVAL = [[WHITE_PAWN_EVAL, WHITE_KNIGHT_EVAL, WHITE_BISHOP_EVAL, WHITE_ROOK_EVAL, WHITE_QUEEN_EVAL,
+             WHITE_KING_MID_EVAL],
+            [BLACK_PAWN_EVAL, BLACK_KNIGHT_EVAL, BLACK_BISHOP_EVAL, BLACK_ROOK_EVAL, BLACK_QUEEN_EVAL,
+             BLACK_KING_MID_EVAL]]
+END_EVAL = [MID_EVAL[0][:5] + [WHITE_KING_END_EVAL], MID_EVAL[1][:5] + [BLACK_KING_END_EVAL]]
+
+
+def _square_values(tables):
+    """ Flattens [color][type][x][y] tables into [piece code][square] values, counted negative for black """
+    values = []
+    for color in range(2):
+        sign = 1 if color == 0 else -1
+        for piece_type in range(6):
+            values.append([sign * (PIECE_VALUES[piece_type] + tables[color][piece_type][sq & 7][sq >> 3])
+                           for sq in range(64)])
+    return values
+
+
+# MID_SQUARE_VALUES[code][sq] is what a piece contributes to white's midgame score, likewise for the endgame
+MID_SQUARE_VALUES = _square_values(MID_EVAL)
+END_SQUARE_VALUES = _square_values(END_EVAL)
+
+# Game phase: the weighted count of pieces left, from MAX_PHASE with every piece on the board down to 0 with
+# only pawns and kings. Evaluation blends the midgame and endgame scores by it.
+PHASE_WEIGHTS = [0, 1, 1, 2, 4, 0] * 2
+MAX_PHASE = 24
@@ -0,0 +1,88 @@
+""" Moves packed into a 16-bit integer: bits 0-5 hold the origin square, bits 6-11 the destination square and
+    bits 12-15 flags describing what kind of move it is.
+
+    Flags follow the usual layout: bit 2 marks a capture and bit 3 a promotion, in which case the low two bits
+    select the promoted piece (knight, bishop, rook, queen).
+"""
+from games.chess.bitboard import *
+
+QUIET = 0
+DOUBLE_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EN_PASSANT = 5
+PROMOTION = 8
+PROMOTION_CAPTURE = PROMOTION | CAPTURE
+
+NULL_MOVE = 0  # a1a1 can never be a real move
+
+PROMOTION_TYPES = [KNIGHT, BISHOP, ROOK, QUEEN]
+
+
+def encode(from_sq, to_sq, flags=QUIET):
+    return from_sq | (to_sq << 6) | (flags << 12)
+
+
+def encode_promotion(from_sq, to_sq, piece_type, capture=False):
+    flags = (PROMOTION_CAPTURE if capture else PROMOTION) | (piece_type - KNIGHT)
+    return from_sq | (to_sq << 6) | (flags << 12)
+
+
+def is_promotion(move):
+    return bool(move & (PROMOTION << 12))
+
+
+def is_tactical(move):
+    """ Captures and promotions, the moves that change material """
+    return bool(move & (PROMOTION_CAPTURE << 12))
+
+
+def promotion_type(move):
+    """ :return int piece type a promotion turns the pawn into """
+    return KNIGHT + ((move >> 12) & 3)
+
+
+def to_server_args(move):
+    """ :return tuple (file, rank, promotionType) as taken by Piece.move for the piece on the origin square """
+    to_sq = (move >> 6) & 63
+    promotion = PIECE_TYPES[promotion_type(move)] if is_promotion(move) else ""
+    return FILE_CHARS[to_sq & 7], (to_sq >> 3) + 1, promotion
+
+
+def from_server_args(squares, from_file, from_rank, file, rank, promotion_type=""):
+    """ Packs a move given in the server's terms.
+
+        :param squares: square-indexed piece codes of the position before the move, i.e. Board.squares
+        :param from_file: chr file the piece moves from
+        :param from_rank: int rank the piece moves from
+        :param file: chr file the piece moves to
+        :param rank: int rank the piece moves to
+        :param promotion_type: str type a pawn promotes to, or "" when it does not promote
+    """
+    from_sq = square(FILE_CHARS.index(from_file), from_rank - 1)
+    to_sq = square(FILE_CHARS.index(file), rank - 1)
+    moving = CODE_TYPE[squares[from_sq]]
+    captured = squares[to_sq] is not None
+    if promotion_type:
+        return encode_promotion(from_sq, to_sq, PIECE_TYPES.index(promotion_type), captured)
+    if captured:
+        return encode(from_sq, to_sq, CAPTURE)
+    if moving == PAWN:
+        if abs(to_sq - from_sq) == 16:
+            return encode(from_sq, to_sq, DOUBLE_PUSH)
+        if (to_sq - from_sq) % 8:
+            return encode(from_sq, to_sq, EN_PASSANT)  # Diagonal onto an empty square
+    if moving == KING and abs(to_sq - from_sq) == 2:
+        return encode(from_sq, to_sq, KING_CASTLE if to_sq > from_sq else QUEEN_CASTLE)
+    return encode(from_sq, to_sq, QUIET)
+
+
+def move_to_str(move):
+    """ :return str the move in long algebraic notation, e.g. e2e4 or e7e8q """
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    s = FILE_CHARS[from_sq & 7] + str((from_sq >> 3) + 1) + FILE_CHARS[to_sq & 7] + str((to_sq >> 3) + 1)
+    if is_promotion(move):
+        s += PIECE_CHARS[promotion_type(move)]
+    return s
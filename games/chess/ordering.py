@@ -0,0 +1,78 @@
+""" Move ordering: the order in which the search tries moves, best guesses first.
+
+    The transposition table move comes first, then captures and promotions by most valuable victim and least
+    valuable attacker, then the two killer moves of the ply, then every other quiet move by its history score.
+"""
+from games.chess.bitboard import *
+from games.chess.move_encoding import *
+
+MAX_PLY = 128
+
+# Bases that keep each kind of move in its own band of scores
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORE = 1 << 22
+# History scores are halved once they reach this, so they stay below the killers
+HISTORY_LIMIT = 1 << 20
+
+
+class MoveOrdering:
+    def __init__(self):
+        # killers[ply] holds the last two quiet moves that caused a beta cutoff at that ply, most recent first
+        self.killers = [[NULL_MOVE, NULL_MOVE] for _ in range(MAX_PLY)]
+        # history[color][from + 64 * to] rewards quiet moves that cause cutoffs, weighted by depth
+        self.history = [[0] * 4096 for _ in COLORS]
+
+    def age(self):
+        """ Halves the history scores, so that a new search trusts them less than what it finds itself """
+        for table in self.history:
+            for i in range(4096):
+                table[i] >>= 1
+
+    def clear_killers(self):
+        for killers in self.killers:
+            killers[0] = killers[1] = NULL_MOVE
+
+    def shift_killers(self, plies):
+        """ Moves the killers up the given number of plies, for a search from a position that many moves later """
+        self.killers = self.killers[plies:] + [[NULL_MOVE, NULL_MOVE] for _ in range(plies)]
+
+    def history_key(self, color):
+        """ :return function giving the history score of a quiet move for the given side """
+        table = self.history[color]
+        return lambda move: table[move & 4095]
+
+    def score(self, state, move, hash_move=NULL_MOVE, ply=0):
+        """ :return int ordering score of a legal move of state, higher is tried first """
+        if move == hash_move:
+            return HASH_MOVE_SCORE
+        if is_tactical(move):
+            return CAPTURE_SCORE + state.capture_score(move)
+        killers = self.killers[ply]
+        if move == killers[0]:
+            return KILLER_SCORE + 1
+        if move == killers[1]:
+            return KILLER_SCORE
+        return self.history[state.side_to_move][move & 4095]
+
+    def cutoff(self, color, move, depth, ply, tried=()):
+        """ Records that a quiet move caused a beta cutoff.
+
+            :param color: int side that played the move
+            :param move: int the move
+            :param depth: int remaining depth of the node, deeper cutoffs count for more
+            :param ply: int distance of the node from the root
+            :param tried: quiet moves searched before it at the node without a cutoff, which lose history
+        """
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+        table = self.history[color]
+        bonus = depth * depth
+        for m in tried:
+            table[m & 4095] = max(table[m & 4095] - bonus, 0)
+        table[move & 4095] += bonus
+        if table[move & 4095] >= HISTORY_LIMIT:
+            self.age()
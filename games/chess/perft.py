@@ -0,0 +1,107 @@
+""" Perft: counts the leaf nodes of the legal move tree to a fixed depth.
+
+    Comparing the counts of standard positions against their published values proves the move generator, and timing
+    them measures its speed. Run from the root of the client:
+
+        python3 -m games.chess.perft                  check every standard position, exit status 1 on a mismatch
+        python3 -m games.chess.perft -d 4             ... to depth 4
+        python3 -m games.chess.perft --divide -d 3    per root move counts of the starting position
+        python3 -m games.chess.perft --divide --fen "<FEN>"
+"""
+import argparse
+import sys
+import time
+
+from games.chess.move_encoding import move_to_str
+from games.chess.state import State
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# (name, FEN, node counts for depth 1, 2, ...) from https://www.chessprogramming.org/Perft_Results
+POSITIONS = [
+    ("start", START_FEN, [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def perft(state, depth):
+    """ :return int number of leaf nodes of the legal move tree below state to the given depth """
+    moves = state.moves
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in list(moves):
+        state.make_move(move)
+        nodes += perft(state, depth - 1)
+        state.unmake_move()
+    return nodes
+
+
+def divide(state, depth):
+    """ :return list of (move, nodes) with the perft count below each root move """
+    counts = []
+    for move in list(state.moves):
+        state.make_move(move)
+        counts.append((move, perft(state, depth - 1) if depth > 1 else 1))
+        state.unmake_move()
+    return counts
+
+
+def run_suite(max_depth=3, positions=POSITIONS):
+    """ Runs perft on every position up to max_depth, printing counts, time and speed.
+
+        :return bool whether every count matched
+    """
+    passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected in positions:
+        state = State(fen=fen)
+        for depth, count in enumerate(expected[:max_depth], 1):
+            start = time.time()
+            nodes = perft(state, depth)
+            elapsed = time.time() - start
+            total_nodes += nodes
+            total_time += elapsed
+            ok = nodes == count
+            passed = passed and ok
+            print("%-10s depth %s: %10s nodes %s %8.2fs %10.0f nodes/s" %
+                  (name, depth, nodes, "ok" if ok else "FAILED, expected %s" % count, elapsed,
+                   nodes / elapsed if elapsed else 0))
+    print("Total: %s nodes in %.2fs, %.0f nodes/s" % (total_nodes, total_time,
+                                                      total_nodes / total_time if total_time else 0))
+    return passed
+
+
+def print_divide(fen, depth):
+    state = State(fen=fen)
+    start = time.time()
+    counts = divide(state, depth)
+    elapsed = time.time() - start
+    for move, nodes in sorted(counts, key=lambda c: move_to_str(c[0])):
+        print("%s: %s" % (move_to_str(move), nodes))
+    total = sum(nodes for _, nodes in counts)
+    print("Moves: %s, nodes: %s, %.2fs, %.0f nodes/s" % (len(counts), total, elapsed,
+                                                         total / elapsed if elapsed else 0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks and times the move generator with perft.")
+    parser.add_argument("-d", "--depth", action="store", dest="depth", type=int, default=3,
+                        help="the depth to search to, every depth up to it is checked in suite mode")
+    parser.add_argument("--divide", action="store_true", dest="divide",
+                        help="print the node count below every root move of a single position")
+    parser.add_argument("--fen", action="store", dest="fen", default=START_FEN,
+                        help="the position to divide, the starting position by default")
+    args = parser.parse_args()
+
+    if args.divide:
+        print_divide(args.fen, args.depth)
+    else:
+        sys.exit(0 if run_suite(args.depth) else 1)
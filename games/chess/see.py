@@ -0,0 +1,72 @@
+""" Static exchange evaluation: the material a capture wins once every recapture on its square has been played out.
+
+    Each side recaptures with its least valuable attacker and may stop whenever continuing would lose material.
+    Sliding pieces lined up behind a capturer join in once it has moved. Pins are not considered.
+"""
+from games.chess.attacks import *
+from games.chess.bitboard import *
+from games.chess.chess import PIECE_VALUES
+from games.chess.move_encoding import *
+
+
+def static_exchange(board, move):
+    """ :param board: Board of the position the move is played in
+        :param move: int packed move, normally a capture or promotion
+        :return int centipawns the side making the move gains from the exchange it starts
+    """
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    flags = move >> 12
+    if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+        return 0
+
+    squares = board.squares
+    pieces = board.pieces
+    occupied = board.occupied ^ BITS[from_sq]
+    side = CODE_COLOR[squares[from_sq]]
+    on_square = PIECE_VALUES[CODE_TYPE[squares[from_sq]]]
+
+    if flags == EN_PASSANT:
+        occupied ^= BITS[square(to_sq & 7, from_sq >> 3)]
+        gain = [PIECE_VALUES[PAWN]]
+    else:
+        gain = [PIECE_VALUES[CODE_TYPE[squares[to_sq]]] if squares[to_sq] is not None else 0]
+    if flags & PROMOTION:
+        on_square = PIECE_VALUES[promotion_type(move)]
+        gain[0] += on_square - PIECE_VALUES[PAWN]
+
+    diagonal = pieces[WHITE][BISHOP] | pieces[BLACK][BISHOP] | pieces[WHITE][QUEEN] | pieces[BLACK][QUEEN]
+    straight = pieces[WHITE][ROOK] | pieces[BLACK][ROOK] | pieces[WHITE][QUEEN] | pieces[BLACK][QUEEN]
+    attackers = (attackers_to(pieces[WHITE], WHITE, to_sq, occupied) |
+                 attackers_to(pieces[BLACK], BLACK, to_sq, occupied)) & occupied
+
+    while True:
+        side = 1 - side
+        own = attackers & board.occupancy[side]
+        if not own:
+            break
+        # Least valuable attacker first
+        for piece_type in range(PAWN, KING + 1):
+            candidates = own & pieces[side][piece_type]
+            if candidates:
+                break
+        if piece_type == KING and attackers & board.occupancy[1 - side]:
+            break  # The king cannot capture onto a defended square
+
+        # Score of taking the piece on the square if there is no recapture, recaptures are settled below
+        score = on_square - gain[-1]
+        if max(-gain[-1], score) < 0:
+            break  # This side loses material whether or not it captures, so the exchange is over
+        gain.append(score)
+        on_square = PIECE_VALUES[piece_type]
+
+        capturer = candidates & -candidates
+        occupied ^= capturer
+        # Reveal sliding pieces that were behind the capturer
+        attackers = (attackers | (bishop_attacks(to_sq, occupied) & diagonal) |
+                     (rook_attacks(to_sq, occupied) & straight)) & occupied
+
+    # Each side chooses between its speculative score and stopping the exchange
+    for d in range(len(gain) - 1, 0, -1):
+        gain[d - 1] = -max(-gain[d - 1], gain[d])
+    return gain[0]
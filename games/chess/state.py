@@ -1,99 +1,99 @@
-from collections import namedtuple
+from games.chess.attacks import *
+from games.chess.bitboard import *
 from games.chess.board import Board
 from games.chess.chess import *
-from operator import attrgetter
+from games.chess.move_encoding import *
+from games.chess.see import static_exchange
+from games.chess.zobrist import *
 
-Move = namedtuple("Move", "piece, file, rank, promotion, capture")
-Move.__new__.__defaults__ = (False, None)
+
+# Castling rights, stored as a bit mask
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLE_CHARS = "KQkq"
+
+# Rights that survive a move touching each square: moving a king or rook, or capturing a rook, loses them
+CASTLE_MASK = [15] * 64
+CASTLE_MASK[0] = 15 ^ WHITE_QUEENSIDE
+CASTLE_MASK[4] = 15 ^ (WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLE_MASK[7] = 15 ^ WHITE_KINGSIDE
+CASTLE_MASK[56] = 15 ^ BLACK_QUEENSIDE
+CASTLE_MASK[60] = 15 ^ (BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLE_MASK[63] = 15 ^ BLACK_KINGSIDE
+
+# Number of half-moves without a capture or pawn move before the game is drawn
+DRAW_HALF_MOVES = 100
+
+
+def parse_castling(field):
+    """ :param field: castling availability field of a Forsyth-Edwards Notation string
+        :return int castling rights bit mask
+    """
+    return sum(1 << i for i, c in enumerate(CASTLE_CHARS) if c in field)
+
+
+def castling_field(rights):
+    """ :param rights: int castling rights bit mask
+        :return str castling availability field of a Forsyth-Edwards Notation string
+    """
+    return "".join(c for i, c in enumerate(CASTLE_CHARS) if rights & (1 << i)) or "-"
 
 
 # noinspection PyShadowingNames,PyProtectedMember
 class State:
-    def __init__(self, game, parent=None, action=None):
-        """ :param action - tuple of the form (piece, rank, file) with optional fourth term `promotion`
-            :param parent - parent state on which to apply action
-            :param action - action to be applied to parent state
-        """
+    def __init__(self, game=None, fen=None):
+        """ Search position built from the game's current state, or from a Forsyth-Edwards Notation string.
+            The position is modified in place with make_move and restored with unmake_move, so a single State
+            serves an entire search.
 
-        if parent is None and action is None:  # Initialize from game FEN
-            self._board = Board(game.fen)  # Have to change in future assignments
-            self._color = game.current_player.color
-            assert self._color in ["Black", "White"]
-            self._fen = game.fen
-            self._en_passant_target = get_en_passant_coordinates(game.fen)
-            for p in game.players:
-                if self._color == p.color:
-                    self._friendly_pieces = [MyPiece(x.owner.color, x.type, x.file, x.rank, x.has_moved, pid=x.id) for x in p.pieces]
-                else:
-                    self._enemy_pieces = [MyPiece(x.owner.color, x.type, x.file, x.rank, x.has_moved, pid=x.id) for x in p.pieces]
-            self._turns_to_draw = get_draw_counter(game.fen)
-            self._castle = list(game.fen.split(" ")[2])
-
-        else:  # Initialize from acting upon a parent
-            assert parent is not None and action is not None
-            self._board = parent.board.copy()
-
-            self._board.move_piece_rf(action.piece.rank, action.piece.file, action.rank, action.file)
-            self._color = "White" if parent.to_move == "Black" else "Black"
-
-            # Check for en passant target
-            if action.piece.type == "Pawn" and (action.rank - action.piece.rank == 2 or
-                                                action.rank - action.piece.rank == -2):
-                r = int((action.piece.rank + action.rank) / 2)
-                self._en_passant_target = get_coordinates(r, action[0].file)
-            else:
-                self._en_passant_target = '-'
-
-            self._friendly_pieces = []  # Modify the piece that was moved
-            self._enemy_pieces = []
-
-            # Could possibly switch to list comprehension followed by a filter()?
-            for p in parent._friendly_pieces:
-                c = p.copy()
-                if c.id == action.piece.id:
-                    c.has_moved = True
-                    c.file = action.file
-                    c.rank = action.rank
-                self._enemy_pieces.append(c)  # Parent friendly pieces become enemy pieces
-
-            # Could possibly switch to list comprehension followed by a filter()?
-            for p in parent._enemy_pieces:
-                c = p.copy()
-                if c.rank == action.rank and c.file == action.file:
-                    c.captured = True
-                self._friendly_pieces.append(c)
-            self._friendly_pieces.sort(key=attrgetter('value'), reverse=True)
-
-            # Captures can only occur on players that are currently friendly (assuming two-player Chess)
-            if action.piece.type == "Pawn" or len(self._friendly_pieces) != len(parent._friendly_pieces):
-                self._turns_to_draw = 50
-            else:
-                self._turns_to_draw = parent._turns_to_draw - 1
-
-            self._castle = parent._castle  # Keep track of castling
-            if self._castle:
-                if (action[0].type == "Rook" and action[0].file == 'a') or action[0].type == "King":
-                    try:
-                        self._castle.remove('q' if action[0].color == "White" else 'Q')
-                    except ValueError:  # Will trigger if the move was not in the list to begin with
-                        pass
-                if (action[0].type == "Rook" and action[0].file == 'h') or action[0].type == "King":
-                    try:
-                        self._castle.remove('k' if action[0].color == "White" else 'K')
-                    except ValueError:  # Will trigger if the move was not in the list to begin with
-                        pass
-
-        self._moves = self.__potential_moves()
-        self._parent = parent
-        self._preceeding_action = action
+            :param game - the Game to read the current position from
+            :param fen - the position as a complete Forsyth-Edwards Notation string, when there is no Game
+        """
+        if game is not None:
+            self._board = Board(pieces=[p for p in game.pieces if not p.captured])
+            fen = game.fen
+        elif fen is not None:
+            self._board = Board(fen)
+        else:
+            raise ValueError("Must pass a Game or a FEN to create a State from")
         self._game = game
-        self._hash = self.__hash__()
-        self._utility = self.__find_utility()
+
+        fields = fen.split(" ")
+        if len(fields) != 6:
+            raise ValueError("FEN must have 6 fields: %s" % fen)
+        placement, side, castling, ep, half_move_clock, full_move = fields
+        if side not in ("w", "b"):
+            raise ValueError("Invalid side to move in FEN: %s" % side)
+        self._us = WHITE if side == "w" else BLACK
+        self._color = COLORS[self._us]
+        self._castle = parse_castling(castling)
+        self._en_passant_target = None if ep == "-" else square(*get_coordinates(int(ep[1]), ep[0]))
+        self._half_move_clock = int(half_move_clock)
+        # Full move number of the root position, later ones follow from the number of moves made
+        self._root_full_move = int(full_move)
+        self._root_us = self._us
+
+        # One entry per move made: (move, moved piece code, captured piece code, castling rights,
+        # en-passant target, draw counter, hash, midgame score, endgame score, phase, moves, legality masks,
+        # attack maps)
+        self._undo_stack = []
+
+        # Running evaluation from white's point of view, updated by every move
+        self._mid_score = 0
+        self._end_score = 0
+        self._phase = 0
+        self.__find_utility()
+
+        # Computed on demand, at most once per position
+        self._moves = None
+        self._legality = None
+        self._attacks = [None, None]
+        self._hash = position_key(self._board, self._us, self._castle, self._en_passant_target)
 
     def __hash__(self):
-        """ Unique identifier of State - all important characteristics should be included. """
-        return hash("%s %s %s %s %s" % (self._board.fen, self._color[0].lower(), self._castle,
-                                        self._en_passant_target, self._turns_to_draw))
+        return self._hash
 
     # ----------------- PROPERTIES -----------------
 
@@ -105,66 +105,315 @@ class State:
     def game(self):
         return self._game
 
+    @property
+    def fen(self):
+        """ The position in Forsyth-Edwards Notation, built on demand. Not for use during search. """
+        ep = "-"
+        if self._en_passant_target is not None:
+            ep = "%s%s" % get_file_rank(self._en_passant_target & 7, self._en_passant_target >> 3)
+        full_move = self._root_full_move + (len(self._undo_stack) + self._root_us) // 2
+        return "%s %s %s %s %s %s" % (self._board.fen, "w" if self._us == WHITE else "b", castling_field(self._castle),
+                                      ep, self._half_move_clock, full_move)
+
     @property
     def hash(self):
+        """ 64-bit Zobrist key of the position, kept up to date by make_move and unmake_move """
         return self._hash
 
     @property
     def moves(self):
+        """ Every legal move in this position. Prefer generate_moves during search. """
+        if self._moves is None:
+            self._moves = self.__potential_moves()
         return self._moves
 
     @property
-    def terminal(self):
-        return self.__test_draw() or self.__in_checkmate()
+    def draw(self):
+        """ Whether the position is drawn by a rule that does not require generating moves:
+            the fifty-move rule, insufficient material or threefold repetition.
+        """
+        return self._half_move_clock >= DRAW_HALF_MOVES \
+            or self.__draw_by_insufficient_material() \
+            or self.__draw_by_threefold_repetition()
+
+    @property
+    def in_check(self):
+        return self.__in_check()
 
     @property
     def to_move(self):
         return self._color
 
+    @property
+    def last_move(self):
+        """ The move that led to this position from the root: NULL_MOVE after a null move, None at the root """
+        return self._undo_stack[-1][0] if self._undo_stack else None
+
+    @property
+    def has_non_pawn_material(self):
+        """ Whether the player to move has a piece besides pawns and the king. Without one, zugzwang is likely. """
+        own = self._board.pieces[self._us]
+        return bool(own[KNIGHT] | own[BISHOP] | own[ROOK] | own[QUEEN])
+
+    @property
+    def side_to_move(self):
+        """ int color of the player to move, see games.chess.bitboard """
+        return self._us
+
     @property
     def utility(self):
-        return int(self._utility)
+        """ Static evaluation of the position for the player to move: the midgame and endgame scores blended by how
+            much material is left. Checkmate and stalemate are left to the search to detect.
+        """
+        phase = min(self._phase, MAX_PHASE)
+        score = (self._mid_score * phase + self._end_score * (MAX_PHASE - phase)) // MAX_PHASE
+        return score if self._us == WHITE else -score
 
     @property
-    def nonquiescent(self):
-        return self.__in_check()
+    def ply(self):
+        """ Number of moves currently made on top of the root position """
+        return len(self._undo_stack)
 
     # -------------- PUBLIC FUNCTIONS --------------
 
-    def move_result(self, action):
-        """ move_result creates a copy of the current state, applies the given action, and returns the result state """
-        return State(self._game, parent=self, action=action)
+    def generate_moves(self, hash_move=None, killers=(), quiet_key=None):
+        """ Yields the legal moves of this position in stages, generating each stage only when the previous one
+            is exhausted: the hash move, captures and promotions by value, killer moves, then the remaining quiet
+            moves. A search that cuts off early never pays for the later stages.
+
+            :param hash_move -- move to try first if it is legal here
+            :param killers -- quiet moves to try before the other quiet moves if they are legal here
+            :param quiet_key -- optional sort key for the quiet moves, highest first
+        """
+        if hash_move and self.is_legal(hash_move):
+            yield hash_move
+
+        for m in self.tactical_moves():
+            if m != hash_move:
+                yield m
+
+        tried = [hash_move]
+        for k in killers:
+            if k and not is_tactical(k) and k not in tried and self.is_legal(k):
+                tried.append(k)
+                yield k
+
+        quiets = []
+        self.__generate(quiets, captures=False)
+        if quiet_key is not None:
+            quiets.sort(key=quiet_key, reverse=True)
+        for m in quiets:
+            if m not in tried:
+                yield m
+
+    def tactical_moves(self):
+        """ :return list of the legal captures and promotions, most promising first """
+        captures = []
+        self.__generate(captures, quiets=False)
+        captures.sort(key=self.capture_score, reverse=True)
+        return captures
+
+    def is_legal(self, move):
+        """ Whether the given move, possibly taken from another position, can be played in this one """
+        from_bit = BITS[move & 63]
+        if not from_bit & self._board.occupancy[self._us]:
+            return False
+        candidates = []
+        self.__generate(candidates, from_mask=from_bit)
+        return move in candidates
+
+    def capture_score(self, move):
+        """ Orders captures by most valuable victim, then least valuable attacker, with promotions by promoted type """
+        squares = self._board.squares
+        score = -PIECE_VALUES[CODE_TYPE[squares[move & 63]]] // 100
+        flags = move >> 12
+        if flags == EN_PASSANT:
+            score += 10 * PIECE_VALUES[PAWN]
+        elif flags & CAPTURE:
+            score += 10 * PIECE_VALUES[CODE_TYPE[squares[(move >> 6) & 63]]]
+        if flags & PROMOTION:
+            score += PIECE_VALUES[promotion_type(move)]
+        return score
+
+    def attacked_squares(self, color):
+        """ Bitboard of every square attacked by the given side, computed at most once per position.
+            The opposing king does not block sliding pieces, so a king may never step back along a line it is
+            attacked on.
+
+            :param color -- int color of the attacking side
+        """
+        attacks = self._attacks[color]
+        if attacks is None:
+            board = self._board
+            occupied = board.occupied ^ board.pieces[1 - color][KING]
+            attacks = self._attacks[color] = attack_map(board.pieces[color], color, occupied)
+        return attacks
+
+    def material_gain(self, move):
+        """ :return int material the player to move wins with a capture or promotion, if it is not recaptured """
+        flags = move >> 12
+        gain = 0
+        if flags == EN_PASSANT:
+            gain = PIECE_VALUES[PAWN]
+        elif flags & CAPTURE:
+            gain = PIECE_VALUES[CODE_TYPE[self._board.squares[(move >> 6) & 63]]]
+        if flags & PROMOTION:
+            gain += PIECE_VALUES[promotion_type(move)] - PIECE_VALUES[PAWN]
+        return gain
+
+    def see(self, move):
+        """ :return int static exchange evaluation of the move: the material won once all recaptures are made """
+        return static_exchange(self._board, move)
+
+    def server_piece(self, move):
+        """ :return Piece the game's piece that the given root move is to be sent for """
+        from_sq = move & 63
+        file, rank = FILE_CHARS[from_sq & 7], (from_sq >> 3) + 1
+        return next(p for p in self._game.pieces if not p.captured and p.file == file and p.rank == rank)
+
+    def make_move(self, move):
+        """ Applies the given move to this state in place. Undo with unmake_move. """
+        board = self._board
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        flags = move >> 12
+
+        key = self._hash ^ SIDE_KEY ^ CASTLE_KEYS[self._castle]
+        if self._en_passant_target is not None:
+            key ^= EN_PASSANT_KEYS[self._en_passant_target & 7]
+
+        mid = self._mid_score
+        end = self._end_score
+        phase = self._phase
+
+        captured = None
+        if flags & CAPTURE:
+            # An en passant capture takes the pawn beside the moving pawn, not on the target
+            captured_sq = square(to_sq & 7, from_sq >> 3) if flags == EN_PASSANT else to_sq
+            captured = board.remove(captured_sq)
+            key ^= PIECE_KEYS[captured][captured_sq]
+            mid -= MID_SQUARE_VALUES[captured][captured_sq]
+            end -= END_SQUARE_VALUES[captured][captured_sq]
+            phase -= PHASE_WEIGHTS[captured]
+
+        code = board.remove(from_sq)
+        self._undo_stack.append((move, code, captured, self._castle, self._en_passant_target, self._half_move_clock,
+                                 self._hash, self._mid_score, self._end_score, self._phase, self._moves,
+                                 self._legality, self._attacks))
+        key ^= PIECE_KEYS[code][from_sq]
+        mid -= MID_SQUARE_VALUES[code][from_sq]
+        end -= END_SQUARE_VALUES[code][from_sq]
+        pawn_move = code == piece_code(self._us, PAWN)
+        if flags & PROMOTION:
+            code = piece_code(self._us, promotion_type(move))
+            phase += PHASE_WEIGHTS[code]
+        board.put(to_sq, code)
+        key ^= PIECE_KEYS[code][to_sq]
+        mid += MID_SQUARE_VALUES[code][to_sq]
+        end += END_SQUARE_VALUES[code][to_sq]
+
+        if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            # Castling also moves the rook to the far side of the king
+            rook_from, rook_to = (to_sq + 1, to_sq - 1) if flags == KING_CASTLE else (to_sq - 2, to_sq + 1)
+            rook = board.remove(rook_from)
+            board.put(rook_to, rook)
+            key ^= PIECE_KEYS[rook][rook_from] ^ PIECE_KEYS[rook][rook_to]
+            mid += MID_SQUARE_VALUES[rook][rook_to] - MID_SQUARE_VALUES[rook][rook_from]
+            end += END_SQUARE_VALUES[rook][rook_to] - END_SQUARE_VALUES[rook][rook_from]
+        self._mid_score = mid
+        self._end_score = end
+        self._phase = phase
+
+        if flags == DOUBLE_PUSH:
+            self._en_passant_target = (from_sq + to_sq) // 2
+            key ^= EN_PASSANT_KEYS[to_sq & 7]
+        else:
+            self._en_passant_target = None
+        if pawn_move or captured is not None:
+            self._half_move_clock = 0
+        else:
+            self._half_move_clock += 1
+        self._castle &= CASTLE_MASK[from_sq] & CASTLE_MASK[to_sq]
+        key ^= CASTLE_KEYS[self._castle]
+
+        self._us = 1 - self._us
+        self._color = COLORS[self._us]
+
+        self._moves = None
+        self._legality = None
+        self._attacks = [None, None]
+        self._hash = key
+
+    def unmake_move(self):
+        """ Reverts the last move applied with make_move. """
+        board = self._board
+        move, code, captured, self._castle, self._en_passant_target, self._half_move_clock, \
+            self._hash, self._mid_score, self._end_score, self._phase, self._moves, self._legality, self._attacks = \
+            self._undo_stack.pop()
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        flags = move >> 12
+
+        self._us = 1 - self._us
+        self._color = COLORS[self._us]
+
+        board.remove(to_sq)
+        board.put(from_sq, code)
+
+        if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            rook_from, rook_to = (to_sq + 1, to_sq - 1) if flags == KING_CASTLE else (to_sq - 2, to_sq + 1)
+            board.put(rook_from, board.remove(rook_to))
+
+        if captured is not None:
+            board.put(square(to_sq & 7, from_sq >> 3) if flags == EN_PASSANT else to_sq, captured)
+
+    def make_null_move(self):
+        """ Passes the turn to the opponent without moving, for null-move pruning. Undo with unmake_null_move. """
+        self._undo_stack.append((NULL_MOVE, None, None, self._castle, self._en_passant_target, self._half_move_clock,
+                                 self._hash, self._mid_score, self._end_score, self._phase, self._moves,
+                                 self._legality, self._attacks))
+        key = self._hash ^ SIDE_KEY
+        if self._en_passant_target is not None:
+            key ^= EN_PASSANT_KEYS[self._en_passant_target & 7]
+            self._en_passant_target = None
+        self._half_move_clock += 1
+
+        self._us = 1 - self._us
+        self._color = COLORS[self._us]
+
+        self._moves = None
+        self._legality = None
+        self._attacks = [None, None]
+        self._hash = key
+
+    def unmake_null_move(self):
+        """ Reverts the last null move applied with make_null_move. """
+        _, _, _, self._castle, self._en_passant_target, self._half_move_clock, self._hash, self._mid_score, \
+            self._end_score, self._phase, self._moves, self._legality, self._attacks = self._undo_stack.pop()
+        self._us = 1 - self._us
+        self._color = COLORS[self._us]
 
     # ----------------- IMPLEMENT ------------------
     def __find_utility(self):
-        utility = 0
-        # Evaluates the quality of piece location
-        if self.__in_checkmate():
-            return -200000  # Value of king
-        if self.__test_draw():
-            return 0
-
-        pieces = self._friendly_pieces + self._enemy_pieces
-        for p in pieces:
-            if p.color == self._game.current_player.color:
-                utility -= p.evaluate()
-            else:
-                utility += p.evaluate()
-
-        return int(utility)
+        """ Computes the running evaluation from scratch: material and piece location of white minus black,
+            and the game phase. make_move keeps these up to date from then on.
+        """
+        squares = self._board.squares
+        for sq in iter_bits(self._board.occupied):
+            code = squares[sq]
+            self._mid_score += MID_SQUARE_VALUES[code][sq]
+            self._end_score += END_SQUARE_VALUES[code][sq]
+            self._phase += PHASE_WEIGHTS[code]
 
     def __draw_by_threefold_repetition(self):
+        if len(self._undo_stack) < 8:
+            return False
         move_history = []
-        s = self
-        for i in range(8):
-            if s._parent is None or s._preceeding_action is None:
-                return False
-            action = s._preceeding_action
-            piece, _, _, promotion, capture = action
-            if piece == "Pawn" or promotion is not None or capture is not None:
+        for entry in self._undo_stack[-8:]:
+            action, code = entry[:2]
+            if action == NULL_MOVE or CODE_TYPE[code] == PAWN or is_tactical(action):
                 return False
             move_history.append(action)
-            s = self._parent
 
         # Check for repeated moves
         if not (move_history[0] == move_history[4] and move_history[1] == move_history[5]
@@ -173,392 +422,191 @@ class State:
         return True
 
     # ----------------- PRIVATE FUNCTIONS -----------------
-    def __add_direction(self, piece, moves, dx, dy):
-        """ Used to generate legal moves for a given piece, in a single given direction.
-            Meant to be called for each diagonal on the Bishop and Queen, and for each direct path for Rook and Queen.
-
-            :param piece -- the piece whose moves are to be tested
-            :param moves -- the list of moves to which to be appended
-            :param dx -- step unit for the x coordinate of the board
-            :param dy -- step unit for the y coordinate of the board
-
-            Note: dx and dy adhere to the computer representation of the board (origin 0,0 top left) and not
-                  the standard representation of a chess board (origin 1-A in the bottom left)
-
-                  WHITE IS STILL ON LOW RANKS. BLACK IS STILL ON HIGH RANKS.
-        """
-
-        xi, yi = get_coordinates(piece.rank, piece.file)
-        xc, yc = xi, yi
-        while 0 <= xc + dx < 8 and 0 <= yc + dy < 8:
-            # This should handle IndexOutOfBounds. If stuff goes wonky add an assert or try/catch here.
-            space_status = self.__test_space(xc + dx, yc + dy)
-            assert space_status in ["Blocked", "Open", "Capturable"]
-            if space_status == "Open" and not self.__in_check(xi, yi, xc+dx, yc+dy):
-                moves.append(Move(piece, file=chr(xc + dx + 96 + 1), rank=(yc + dy + 1)))
-            elif space_status == "Capturable" and not self.__in_check(xi, yi, xc+dx, yc+dy):
-                moves.insert(0, Move(piece, file=chr(xc + dx + 96 + 1), rank=(yc + dy + 1),
-                                     capture=self._board[xc+dx][yc+dy]))
-            if space_status != "Open":
-                break
-            xc += dx
-            yc += dy
-
     def __draw_by_insufficient_material(self):
         """ Performs a check that the state is not one of insufficient material - which results in a draw """
-        fp = [p.type for p in self._friendly_pieces]
-        ep = [p.type for p in self._enemy_pieces]
-
-        # Test for Kk
-        if len(fp) is 1 and len(ep) is 1:
-            return True
-
-        # Test for KNk with N on either side
-        elif (len(fp) is 1 and len(ep) is 2 and "Knight" in ep) \
-                or (len(ep) is 1 and len(fp) is 2 and "Knight" in fp):
-            return True
+        white, black = self._board.pieces
+        if white[PAWN] | white[ROOK] | white[QUEEN] | black[PAWN] | black[ROOK] | black[QUEEN]:
+            return False
+        white_minors = popcount(white[KNIGHT] | white[BISHOP])
+        black_minors = popcount(black[KNIGHT] | black[BISHOP])
 
-        #  Test for KBk with B on either side
-        elif (len(fp) is 1 and len(ep) is 2 and "Bishop" in ep) \
-                or (len(ep) is 1 and len(fp) is 2 and "Bishop" in fp):
+        # Test for Kk, and KNk or KBk with the minor piece on either side
+        if white_minors + black_minors <= 1:
             return True
 
-        #  Test for KBk with B on either side
-        elif len(fp) is 2 and len(ep) is 2 and "Bishop" in ep and "Bishop" in fp:
-            p = list(filter(lambda x: x.type == "Bishop", fp+ep))
-            x0, y0 = get_coordinates(p[0].rank, p[0].file)
-            x1, y1 = get_coordinates(p[1].rank, p[1].file)
+        #  Test for KBkb with both bishops on the same color
+        elif white_minors == 1 and black_minors == 1 and white[BISHOP] and black[BISHOP]:
+            sq0 = lsb(white[BISHOP])
+            sq1 = lsb(black[BISHOP])
             # Due to grid pattern, sum of x/y coordinate should alternate between even and odd for white and black
             # If both pieces even or both pieces odd, then both pieces on same color
-            return x0 + y0 % 2 == x1 + y1 % 2
+            return (square_x(sq0) + square_y(sq0)) % 2 == (square_x(sq1) + square_y(sq1)) % 2
 
         return False
 
-    def __enemy(self, piece: str):
-        """
-            Used to quickly and easily refer to friendly pieces by their representative
-            character (FEN) regardless of player color.
-            :param piece: String (intended to be single character but not required).
-            :return: Returns the given string either in fully upper-case or lower-case
-                     depending on player color, to reflect Forsyth-Edwards Notation
-        """
-        assert type(piece) is str
-        if self._color == "White":
-            return piece.lower()
-        elif self._color == "Black":
-            return piece.upper()
-
-    def __friendly(self, piece: str):
-        """
-          Used to quickly and easily refer to friendly pieces by their representative
-          character (FEN) regardless of player color.
-          :param piece: String (intended to be single character but not required).
-          :return: Returns the given string either in fully upper-case or lower-case
-                     depending on player color, to reflect Forsyth-Edwards Notation
-        """
-        assert type(piece) is str
-        if self._color == "White":
-            return piece.upper()
-        elif self._color == "Black":
-            return piece.lower()
-
-    def __in_check(self, xi=0, yi=0, xf=0, yf=0, move_king=False):
+    def __in_check(self):
+        """ Returns:
+                bool:   Represents whether or not friendly king is in check
         """
-            Cycles through all potentially dangerous spaces to confirm whether or not if king is in check
-            after a specific move is taken. In other words, confirms whether a move should be prevented by allowing
-            a check to occur.
-
-            :param xi: integer representing the initial x coordinate of piece to move
-            :param yi: integer representing the initial y coordinate of piece to move
-            :param xf: integer representing the final x coordinate of piece to move
-            :param yf: integer representing the final y coordinate of piece to move
-            :param move_king: bool representing whether or not the piece being moved is the friendly king
+        return bool(self._board.pieces[self._us][KING] & self.attacked_squares(1 - self._us))
 
-            Returns:
-                bool:   Represents whether or not friendly king is in check
+    def __legality_masks(self):
+        """ Computes, once per position, what every friendly move must satisfy to leave the king safe:
+            the mask of squares that resolve a check, and the pinned pieces with the line each is pinned along.
         """
-        king = next(p for p in self._friendly_pieces if p.type == "King")
-        if move_king is False:
-            kx, ky = get_coordinates(king.rank, king.file)
+        board = self._board
+        us = self._us
+        them = 1 - us
+        enemy = board.pieces[them]
+        occupied = board.occupied
+        king_sq = lsb(board.pieces[us][KING])
+
+        checkers = attackers_to(enemy, them, king_sq, occupied)
+        if not checkers:
+            check_mask = FULL
+        elif checkers & (checkers - 1):
+            check_mask = EMPTY  # Double check: only the king can move
         else:
-            kx, ky = xf, yf
-
-        new_board = self._board.copy()
-        # Move piece indicator
-        assert 0 <= xi < 8
-        assert 0 <= yi < 8
-        marker = new_board[xi][yi]
-        new_board[xi][yi] = ""
-        new_board[xf][yf] = marker
-
-        def direction_threatens_check(dx, dy):
-            x = kx
-            y = ky
-            if dx != 0 and dy != 0:
-                enemies = [self.__enemy("Q"), self.__enemy("B")]
-            else:
-                enemies = [self.__enemy("Q"), self.__enemy("R")]
-            while 0 <= x + dx < 8 and 0 <= y + dy < 8:
-                if new_board[x + dx][y + dy] != "":
-                    if new_board[x + dx][y + dy] in enemies:
-                        return True
-                    else:
-                        return False
-                x += dx
-                y += dy
-            return False
-
-        def space_threatens_check(x, y, piece):
-            if 0 <= x < new_board.width and 0 <= y < new_board.height:
-                if new_board[x][y] == self.__enemy(piece):
-                    return True
-
-        # Knights encircling the king
-        knight_mods = [(2, 1), (2, -1), (-1, -2), (1, -2), (-2, -1), (-2, 1), (-1, 2), (1, 2)]
-        for m in knight_mods:
-            dx, dy = m
-            if space_threatens_check(kx + dx, ky + dy, "N"):
-                return True
-
-        # Pawns diagonal and facing king
-        if self._color == "White":
-            dy = 1
-        else:  # if self._color == "Black":
-            dy = -1
-        for dx in [-1, 1]:
-            if space_threatens_check(kx + dx, ky + dy, "P"):
-                return True
-
-        # Rooks, bishop, queen, by radiating a direction
-        dir_mods = [-1, 0, 1]
-        for dx in dir_mods:
-            for dy in dir_mods:
-                if not (dx == 0 and dy == 0) and direction_threatens_check(dx, dy):
-                    return True
-
-        # Enemy king
-        x_mods = [1, 0, -1]
-        y_mods = [1, 0, -1]
-        for dx in x_mods:
-            for dy in y_mods:
-                if not (dx == 0 and dy == 0) and space_threatens_check(kx + dx, ky + dy, "K"):
-                    return True
-
-        # No pieces threatening check!
-        return False
-
-    def __in_checkmate(self):
-        """ Performs a check that the friendly player is currently checkmated """
-        return self.__in_check() and len(self.moves) == 0
+            check_mask = checkers | BETWEEN[king_sq][lsb(checkers)]
+
+        # Enemy sliders that would attack the king if friendly pieces were not in the way
+        enemy_occupied = board.occupancy[them]
+        snipers = (rook_attacks(king_sq, enemy_occupied) & (enemy[ROOK] | enemy[QUEEN])) | \
+                  (bishop_attacks(king_sq, enemy_occupied) & (enemy[BISHOP] | enemy[QUEEN]))
+        pinned = EMPTY
+        for sniper in iter_bits(snipers):
+            blockers = BETWEEN[king_sq][sniper] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & board.occupancy[us]:
+                pinned |= blockers
+        self._legality = (king_sq, check_mask, pinned)
+
+    def __allowed_targets(self, sq):
+        """ :return bitboard of squares a non-king friendly piece on sq may move to without exposing the king """
+        king_sq, check_mask, pinned = self._legality
+        if BITS[sq] & pinned:
+            return check_mask & LINE[king_sq][sq]
+        return check_mask
 
     def __potential_moves(self):
         """ Cycles through all pieces and generates a list of moves that are valid given the current state of the game.
            :return: List of valid moves from current state. tuple(piece, file, rank)
         """
         valid_move_list = []
-
-        def conditional_append(ol, el):
-            """ Meant to prevent an append of a list of zero potential moves
-                :param ol -- original list
-                :param el -- new list of elements to append
-            """
-            if el is not None:
-                [ol.append(e) for e in el]
-
-        assert len(self._friendly_pieces) > 0
-        for p in self._friendly_pieces:
-            if p.captured is False:
-                piece_type = p.type.strip('\n')
-                if piece_type == "Queen":  # DONE: Confirmed working.
-                    queen_moves = self.__potential_queen_moves(p)
-                    conditional_append(valid_move_list, queen_moves)
-                elif piece_type == "Pawn":
-                    pawn_moves = self.__potential_pawn_moves(p)
-                    conditional_append(valid_move_list, pawn_moves)
-                elif piece_type == "King":
-                    king_moves = self.__potential_king_moves(p)
-                    conditional_append(valid_move_list, king_moves)
-                elif piece_type == "Knight":
-                    knight_moves = self.__potential_knight_moves(p)
-                    conditional_append(valid_move_list, knight_moves)
-                elif piece_type == "Rook":
-                    rook_moves = self.__potential_rook_moves(p)
-                    conditional_append(valid_move_list, rook_moves)
-                elif piece_type == "Bishop":
-                    bishop_moves = self.__potential_bishop_moves(p)
-                    conditional_append(valid_move_list, bishop_moves)
-
+        self.__generate(valid_move_list)
         return valid_move_list
 
-    def __potential_bishop_moves(self, bishop):
-        """ Tests all possible moves from given bishop and returns list of valid moves """
-        assert bishop.type == "Bishop"
-        move_list = []
-        self.__add_direction(bishop, move_list, 1, 1)
-        self.__add_direction(bishop, move_list, -1, 1)
-        self.__add_direction(bishop, move_list, 1, -1)
-        self.__add_direction(bishop, move_list, -1, -1)
-        if len(move_list) == 0:
-            return None
-        return move_list
-
-    def __potential_king_moves(self, king):
-        """ Tests all possible moves from given king and returns list of valid moves """
-        assert king.type == "King"
-        x, y = get_coordinates(king.rank, king.file)
-        move_list = []
-
-        def append_space_if_valid(xf, yf):
-            space = self.__test_space(xf, yf)
-            if space == "Open" and not self.__in_check(x, y, xf, yf, move_king=True):
-                move_list.append(Move(king, file=chr(xf + 97), rank=(yf + 1)))
-            elif space == "Capturable" and not self.__in_check(x, y, xf, yf, move_king=True):
-                move_list.append(Move(king, file=chr(xf + 97), rank=(yf + 1), capture=self._board[xf][yf]))
-
-        append_space_if_valid(x+1, y)  # Straight-right
-        append_space_if_valid(x+1, y+1)  # Diagonal right-down
-        append_space_if_valid(x+1, y-1)  # Diagonal right-up
-        append_space_if_valid(x-1, y)  # Straight-left
-        append_space_if_valid(x-1, y+1)  # Diagonal left-down
-        append_space_if_valid(x-1, y-1)  # Diagonal left-up
-        append_space_if_valid(x, y+1)  # Straight down
-        append_space_if_valid(x, y-1)  # Straight up
-
-        if self.__friendly("K") in self._castle and not self.__in_check(x, y, x, y):
-            # King-side castle
-            if self.__test_space(x+1, y) == "Open" and self.__test_space(x+2, y) == "Open":
-                if not self.__in_check(x, y, x+1, y, move_king=True) and \
-                        not self.__in_check(x, y, x+2, y, move_king=True):
-                    move_list.append(Move(king, file=chr(x+2 + 97), rank=(y + 1)))
+    def __generate(self, move_list, captures=True, quiets=True, from_mask=FULL):
+        """ Generates legal moves into move_list.
 
-        if self.__friendly("Q") in self._castle and not self.__in_check(x, y, x, y):
-            # Queen-side castle
-            if self.__test_space(x - 1, y) == "Open" and self.__test_space(x - 2, y) == "Open" \
-                    and self.__test_space(x - 3, y) == "Open" and not self.__in_check(x, y, x - 1, y, move_king=True) \
-                    and not self.__in_check(x, y, x - 2, y, move_king=True):
-                move_list.append(Move(king, file=chr(x - 2 + 97), rank=(y + 1)))
-
-        if len(move_list) == 0:
-            return None
-        return move_list
-
-    def __potential_knight_moves(self, knight):
-        """ Tests all possible moves from given knight and returns list of valid moves """
-        assert knight.type == "Knight"
-        x, y = get_coordinates(knight.rank, knight.file)
-        move_list = []
-        for m in [(2, 1), (2, -1), (-1, -2), (1, -2), (-2, -1), (-2, 1), (-1, 2), (1, 2)]:
-            dx, dy = m
-            if 0 <= x+dx < self._board.width and 0 <= y+dy < self._board.height:
-                space = self.__test_space(x + dx, y + dy)
-                if space == "Open" and not self.__in_check(x, y, x+dx, y+dy):
-                    move_list.append(Move(knight, file=chr(x+dx + 97), rank=(y+dy + 1)))
-                elif space == "Capturable" and not self.__in_check(x, y, x+dx, y+dy):
-                    move_list.append(Move(knight, file=chr(x+dx + 97), rank=(y+dy + 1),
-                                          capture=self._board[x+dx][y+dy]))
-        if len(move_list) == 0:
-            return None
-        return move_list
-
-    def __potential_pawn_moves(self, pawn):
-        """ Tests all possible moves from given pawn and returns list of valid moves """
-        assert pawn.type == "Pawn"
-        x, y = get_coordinates(pawn.rank, pawn.file)
-        move_list = []
-        if self._color == "White":
-            dy = 1
-        else:  # if self._color == "Black":
-            dy = -1
-
-        def add_pawn_move(xf, yf, capture=None):
-            """ Wrapper to add the pawns movement. Main purpose is to handle promotions. """
-            f = chr(xf + 97)
-            r = yf + 1
-            if (self._color == "White" and r == 8) or (self._color == "Black" and r == 1):
-                promotions = ["Bishop", "Rook", "Knight", "Queen"]
-                [move_list.append(Move(pawn, file=f, rank=r, promotion=p, capture=capture)) for p in promotions]
-            else:
-                move_list.append(Move(pawn, file=f, rank=r))
-
-        # Check immediate ahead is open
-        if self.__test_space(x, y+dy) == "Open" and not self.__in_check(x, y, x, y+dy):
-            add_pawn_move(x, y+dy)
-
-        # Check double-forward. Both on initial row, and both spaces immediately ahead are open.
-        if (pawn.rank == 2 and self._color == "White") or (pawn.rank == 7 and self._color == "Black"):
-            if self.__test_space(x, y+2*dy) == "Open" and self.__test_space(x, y+dy) == "Open":
-                if not self.__in_check(x, y, x, y+2*dy):
-                    add_pawn_move(x, y+2*dy)
-
-        # Check for capturable units including en passant target
-        if self.__test_space(x-1, y+dy) == "Capturable":  # or (x-1, y+dy) == self._en_passant_target:
-            if not self.__in_check(x, y, x-1, y+dy):
-                add_pawn_move(x-1, y+dy, capture=self._board[x-1][y+dy])
-        if self.__test_space(x+1, y+dy) == "Capturable":  # or (x+1, y+dy) == self._en_passant_target:
-            if not self.__in_check(x, y, x+1, y+dy):
-                add_pawn_move(x+1, y+dy, capture=self._board[x+1][y+dy])
-
-        if (x-1, y+dy) == self._en_passant_target:
-            if not self.__in_check(x, y, x-1, y+dy):
-                add_pawn_move(x-1, y+dy)
-        if (x+1, y+dy) == self._en_passant_target:
-            if not self.__in_check(x, y, x+1, y+dy):
-                add_pawn_move(x+1, y+dy)
-
-        if len(move_list) == 0:
-            return None
-        return move_list
-
-    def __potential_rook_moves(self, rook):
-        """ Tests all possible moves from given rook and returns list of valid moves """
-        assert rook.type == "Rook"
-        move_list = []
-        self.__add_direction(rook, move_list, 0, 1)  # Down
-        self.__add_direction(rook, move_list, 0, -1)  # Up
-        self.__add_direction(rook, move_list, 1, 0)  # Right
-        self.__add_direction(rook, move_list, -1, 0)  # Left
-        if len(move_list) == 0:
-            return None
-        return move_list
-
-    def __potential_queen_moves(self, queen):
-        """ Tests all possible moves from given queen and returns list of valid moves """
-        assert queen.type == "Queen"
-        move_list = []
-        self.__add_direction(queen, move_list, 1, 1)  # Down-right diagonal
-        self.__add_direction(queen, move_list, -1, 1)  # Down-left diagonal
-        self.__add_direction(queen, move_list, 1, -1)  # Up-right diagonal
-        self.__add_direction(queen, move_list, -1, -1)  # Up-left diagonal
-        self.__add_direction(queen, move_list, 0, 1)  # Straight down
-        self.__add_direction(queen, move_list, 0, -1)  # Straight up
-        self.__add_direction(queen, move_list, 1, 0)  # Straight right
-        self.__add_direction(queen, move_list, -1, 0)  # Straight left
-
-        return move_list
-
-    def __test_draw(self):
-        """ Returns:
-            bool:   True under the standard conditions for a stalemate, or a draw
-                    either by turn or insufficient material
+            :param move_list -- the list of moves to which to be appended
+            :param captures -- whether to generate captures and promotions
+            :param quiets -- whether to generate every other move
+            :param from_mask -- bitboard of the friendly pieces to generate moves for, all of them by default
         """
-        return (not self.__in_check() and len(self.moves) == 0) \
-            or self._turns_to_draw == 0 \
-            or self.__draw_by_insufficient_material() \
-            or self.__draw_by_threefold_repetition()
-
-    def __test_space(self, x, y):
-        """ Returns:
-            str:  Represents the state of that space, which can be any of:
-                  `Capturable', `Blocked', `Open', `Out of Bounds'
+        if self._legality is None:
+            self.__legality_masks()
+        board = self._board
+        own = board.pieces[self._us]
+        occupied = board.occupied
+        target_filter = EMPTY
+        if captures:
+            target_filter |= board.occupancy[1 - self._us]
+        if quiets:
+            target_filter |= FULL ^ occupied
+
+        king_sq = self._legality[0]
+        if BITS[king_sq] & from_mask:
+            self.__potential_king_moves(king_sq, move_list, target_filter, quiets)
+        if self._legality[1] == EMPTY:
+            return  # Double check: only the king can move
+
+        for sq in iter_bits(own[PAWN] & from_mask):
+            self.__potential_pawn_moves(sq, move_list, captures, quiets)
+        for sq in iter_bits(own[KNIGHT] & from_mask):
+            self.__add_targets(sq, KNIGHT_ATTACKS[sq] & target_filter & self.__allowed_targets(sq), move_list)
+        for sq in iter_bits(own[BISHOP] & from_mask):
+            self.__add_targets(sq, bishop_attacks(sq, occupied) & target_filter & self.__allowed_targets(sq),
+                               move_list)
+        for sq in iter_bits(own[ROOK] & from_mask):
+            self.__add_targets(sq, rook_attacks(sq, occupied) & target_filter & self.__allowed_targets(sq),
+                               move_list)
+        for sq in iter_bits(own[QUEEN] & from_mask):
+            self.__add_targets(sq, queen_attacks(sq, occupied) & target_filter & self.__allowed_targets(sq),
+                               move_list)
+
+    def __add_targets(self, sq, targets, move_list):
+        """ Appends a move for every target square that is not blocked by a friendly piece.
+
+            :param sq -- the square of the piece whose moves are to be added
+            :param targets -- bitboard of legal squares the piece attacks
+            :param move_list -- the list of moves to which to be appended
         """
-        if 0 <= x < self._board.width and 0 <= y < self._board.height:
-            if self._board[x][y] != "":
-                if (self._color == "White" and self._board[x][y].islower()) or \
-                        (self._color == "Black" and self._board[x][y].isupper()):
-                    return "Capturable"
-                else:
-                    return "Blocked"
+        board = self._board
+        enemies = board.occupancy[1 - self._us]
+        for to in iter_bits(targets & ~board.occupancy[self._us]):
+            if BITS[to] & enemies:
+                move_list.append(encode(sq, to, CAPTURE))
             else:
-                return "Open"
+                move_list.append(encode(sq, to))
+
+    def __potential_king_moves(self, sq, move_list, target_filter, castles):
+        """ Tests all possible moves from the king on the given square and adds the valid ones to move_list """
+        occupied = self._board.occupied
+        attacked = self.attacked_squares(1 - self._us)
+        self.__add_targets(sq, KING_ATTACKS[sq] & target_filter & ~attacked, move_list)
+
+        if not castles or self._legality[1] != FULL:
+            return  # Cannot castle out of check
+        if self._castle & (WHITE_KINGSIDE if self._us == WHITE else BLACK_KINGSIDE) and \
+                not (occupied | attacked) & (BITS[sq + 1] | BITS[sq + 2]):
+            # King-side castle
+            move_list.append(encode(sq, sq + 2, KING_CASTLE))
+
+        if self._castle & (WHITE_QUEENSIDE if self._us == WHITE else BLACK_QUEENSIDE) and \
+                not occupied & (BITS[sq - 1] | BITS[sq - 2] | BITS[sq - 3]) and \
+                not attacked & (BITS[sq - 1] | BITS[sq - 2]):
+            # Queen-side castle
+            move_list.append(encode(sq, sq - 2, QUEEN_CASTLE))
+
+    def __potential_pawn_moves(self, sq, move_list, captures, quiets):
+        """ Tests all possible moves from the pawn on the given square and adds the valid ones to move_list """
+        board = self._board
+        occupied = board.occupied
+        allowed = self.__allowed_targets(sq)
+        if self._us == WHITE:
+            forward, start_rank, last_rank = 8, RANK_1 << 8, RANK_8
         else:
-            return "Out of Bounds"
+            forward, start_rank, last_rank = -8, RANK_8 >> 8, RANK_1
+
+        def add_pawn_move(to, flags=QUIET):
+            """ Wrapper to add the pawns movement. Main purpose is to handle promotions. """
+            if BITS[to] & last_rank:
+                for t in PROMOTION_TYPES:
+                    move_list.append(encode_promotion(sq, to, t, flags == CAPTURE))
+            else:
+                move_list.append(encode(sq, to, flags))
+
+        # Check immediate ahead is open, then double-forward from the initial row. Promotions count as captures.
+        one = sq + forward
+        if not occupied & BITS[one]:
+            if BITS[one] & allowed and (captures if BITS[one] & last_rank else quiets):
+                add_pawn_move(one)
+            two = one + forward
+            if quiets and BITS[sq] & start_rank and not occupied & BITS[two] and BITS[two] & allowed:
+                add_pawn_move(two, DOUBLE_PUSH)
+
+        if not captures:
+            return
+
+        # Check for capturable units
+        for to in iter_bits(PAWN_ATTACKS[self._us][sq] & board.occupancy[1 - self._us] & allowed):
+            add_pawn_move(to, CAPTURE)
+
+        # En passant removes two pawns from the board at once, so it gets a dedicated attack test
+        ep = self._en_passant_target
+        if ep is not None and PAWN_ATTACKS[self._us][sq] & BITS[ep]:
+            captured_bit = BITS[ep - forward]
+            after = (occupied ^ BITS[sq] ^ captured_bit) | BITS[ep]
+            them = 1 - self._us
+            if not attackers_to(board.pieces[them], them, self._legality[0], after) & ~captured_bit:
+                move_list.append(encode(sq, ep, EN_PASSANT))
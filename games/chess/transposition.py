@@ -0,0 +1,160 @@
+""" Transposition table: search results of positions keyed by their Zobrist hash.
+
+    The table is a fixed number of two-slot buckets held in preallocated arrays of 64-bit integers, so its memory use
+    is set once and never grows. The first slot of a bucket keeps the deepest result, the second is always replaced.
+    Every entry is packed into a single integer next to its key:
+
+        bits  0-15  best move (see games.chess.move_encoding)
+        bits 16-23  remaining depth the position was searched to
+        bits 24-25  bound type
+        bits 26-31  age, the search the entry was written by
+        bits 32-63  score, offset to be non-negative
+
+    The key is stored XOR-ed with the packed entry. A table in shared memory is written by several processes without
+    locks, and an entry torn by two of them writing at once then no longer matches its key and is simply missed.
+"""
+from array import array
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python 3.7 and earlier
+    shared_memory = None
+
+# Bound types: the stored score is exact, at least the true score (fail high) or at most the true score (fail low)
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+DEFAULT_SIZE_MB = 16
+ENTRY_BYTES = 16  # key and data
+BUCKET_SLOTS = 2
+
+_SCORE_OFFSET = 1 << 31
+_AGE_MASK = 63
+
+
+def table_entries(size_mb):
+    """ :return int number of entries a table of the given size holds, a whole number of buckets that is a power of
+        two so that a bucket is found with a mask
+    """
+    buckets = max(1, int(size_mb * 1024 * 1024) // (ENTRY_BYTES * BUCKET_SLOTS))
+    return BUCKET_SLOTS << (buckets.bit_length() - 1)
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=DEFAULT_SIZE_MB, buffer=None):
+        """ :param size_mb: memory to allocate for the table in megabytes
+            :param buffer: writable buffer of at least ENTRY_BYTES bytes per entry to hold the table in, instead of
+                           allocating it
+        """
+        entries = table_entries(size_mb)
+        self._mask = entries // BUCKET_SLOTS - 1
+        self._view = None
+        if buffer is None:
+            self._keys = array("Q", bytes(8 * entries))
+            self._data = array("Q", bytes(8 * entries))
+        else:
+            self._view = memoryview(buffer)[:ENTRY_BYTES * entries].cast("Q")
+            self._keys = self._view[:entries]
+            self._data = self._view[entries:]
+        self._age = 0
+
+    def __len__(self):
+        """ :return int number of entries the table can hold """
+        return len(self._keys)
+
+    @property
+    def age(self):
+        return self._age
+
+    @age.setter
+    def age(self, age):
+        """ Lets every process sharing a table write entries for the same search """
+        self._age = age & _AGE_MASK
+
+    def new_search(self):
+        """ Marks the start of a new search. Entries from earlier searches are kept, but are the first replaced. """
+        self._age = (self._age + 1) & _AGE_MASK
+
+    def release(self):
+        """ Gives up the table's views of its buffer, after which it can no longer be used """
+        if self._view is not None:
+            self._keys.release()
+            self._data.release()
+            self._view.release()
+            self._view = None
+
+    def probe(self, key):
+        """ :param key: int 64-bit Zobrist key of the position
+            :return tuple (move, depth, bound, score) stored for the position, or None
+        """
+        i = (key & self._mask) * BUCKET_SLOTS
+        keys = self._keys
+        data = self._data[i]
+        if keys[i] ^ data != key:
+            i += 1
+            data = self._data[i]
+            if keys[i] ^ data != key:
+                return None
+        return data & 0xFFFF, (data >> 16) & 0xFF, (data >> 24) & 3, (data >> 32) - _SCORE_OFFSET
+
+    def store(self, key, move, depth, bound, score):
+        """ Records a search result. A position already in the bucket is updated in place. Otherwise the
+            depth-preferred slot is taken when the new result is at least as deep as the one there, or that one is
+            from an earlier search, and the always-replace slot is taken when it is not.
+
+            :param key: int 64-bit Zobrist key of the position
+            :param move: int best move found, or 0 when there is none
+            :param depth: int remaining depth the position was searched to
+            :param bound: int EXACT, LOWER or UPPER
+            :param score: int score of the position for the player to move
+        """
+        i = (key & self._mask) * BUCKET_SLOTS
+        keys = self._keys
+        data = self._data
+        if keys[i] ^ data[i] != key:
+            if keys[i + 1] ^ data[i + 1] == key:
+                i += 1
+            else:
+                old = data[i]
+                if keys[i] and ((old >> 16) & 0xFF) > depth and ((old >> 26) & _AGE_MASK) == self._age:
+                    i += 1
+        if not move and keys[i] ^ data[i] == key:
+            move = data[i] & 0xFFFF  # Keep the best move known for the position
+
+        packed = move | (min(max(depth, 0), 0xFF) << 16) | (bound << 24) | (self._age << 26) | \
+            ((score + _SCORE_OFFSET) << 32)
+        keys[i] = key ^ packed
+        data[i] = packed
+
+
+class SharedTranspositionTable(TranspositionTable):
+    def __init__(self, size_mb=DEFAULT_SIZE_MB, name=None):
+        """ A transposition table in shared memory, searched by several processes at once.
+
+            :param size_mb: memory to allocate for the table in megabytes
+            :param name: name of an existing shared table to attach to, a new one is created when None
+        """
+        if shared_memory is None:
+            raise RuntimeError("Sharing a transposition table between processes needs Python 3.8 or later")
+        self.size_mb = size_mb
+        self._owner = name is None
+        if self._owner:
+            self._memory = shared_memory.SharedMemory(create=True, size=ENTRY_BYTES * table_entries(size_mb))
+        else:
+            # Processes started by the creator share its resource tracker, which frees the table if it exits uncleanly
+            self._memory = shared_memory.SharedMemory(name=name)
+        TranspositionTable.__init__(self, size_mb, self._memory.buf)
+
+    @property
+    def name(self):
+        """ Name other processes attach to the table by """
+        return self._memory.name
+
+    def close(self):
+        """ Detaches from the table, and frees it if this process created it """
+        self.release()
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
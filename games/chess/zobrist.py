@@ -0,0 +1,39 @@
+""" Zobrist keys: a random 64-bit number per (piece, square), side to move, castling rights and en-passant file.
+
+    A position's key is the XOR of the numbers for everything in it, so a move updates the key by XOR-ing out
+    what it removes and XOR-ing in what it adds.
+"""
+import random
+
+from games.chess.bitboard import *
+
+# Seeded so that keys, and anything stored under them, are the same from one run to the next
+_random = random.Random(0x5EED)
+
+# PIECE_KEYS[code][sq] for every piece code of games.chess.bitboard
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+# Present while black is to move
+SIDE_KEY = _random.getrandbits(64)
+# CASTLE_KEYS[rights] for every castling rights bit mask
+CASTLE_KEYS = [_random.getrandbits(64) for _ in range(16)]
+# EN_PASSANT_KEYS[x] for the file of the en-passant target
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+
+def position_key(board, us, castle, en_passant_target):
+    """ Computes the key of a position from scratch.
+
+        :param board: Board holding the piece placement
+        :param us: int color to move
+        :param castle: int castling rights bit mask
+        :param en_passant_target: int square of the en-passant target, or None
+        :return int 64-bit Zobrist key
+    """
+    key = CASTLE_KEYS[castle]
+    for sq in iter_bits(board.occupied):
+        key ^= PIECE_KEYS[board.squares[sq]][sq]
+    if us == BLACK:
+        key ^= SIDE_KEY
+    if en_passant_target is not None:
+        key ^= EN_PASSANT_KEYS[en_passant_target & 7]
+    return key